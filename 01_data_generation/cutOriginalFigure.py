@@ -1,47 +1,59 @@
 import numpy as np
 import cv2
-import json
-from matplotlib import pyplot as plt
 import os
+import time
+from multiprocessing import Pool
 
 directory = r"D:\Dataset\picture1"
 cut_directory = r"D:\Dataset\cut_picture1"
 
-os.chdir(directory)
-files = os.listdir('.')
-m = 0
-while m < len(files):
-    image_src = cv2.imread(files[m])
-    break_flag = False
-    start_row = 0
-    for i in image_src:
-        start_col = 0
-        for j in i:
-            if list(j).count(254) != 3:
-                break_flag = True
-                break
-            start_col += 1
-        if break_flag:
-            break
-        start_row += 1
-    print(start_row, start_col)
-
-    break_flag = False
-    end_row = image_src.shape[0]
-    for i in reversed(image_src):
-        end_col = image_src.shape[1]
-        for j in reversed(i):
-            if list(j).count(254) != 3:
-                break_flag = True
-                break
-            end_col -= 1
-        if break_flag:
-            break
-        end_row -= 1
-    print(end_row, end_col)
-
-    cropped = image_src[start_row:end_row, start_col:end_col]
-    # print(cropped.shape)
-    exportname = os.path.join(cut_directory, files[m])
-    cv2.imwrite(exportname, cropped)
-    m += 1
+
+def crop_box(image_src, background=254):
+    # find the crop box of the exported figure with array reductions
+    # start_row/end_row: first/last row containing a non-background pixel
+    # start_col: first non-background pixel in start_row, end_col: last non-background pixel in end_row - 1
+    # (same definition as the original per-pixel scan, an all-background image gives (h, w, 0, 0))
+    if image_src.ndim == 3:
+        mask = (image_src != background).any(axis=2)
+    else:
+        mask = image_src != background
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return image_src.shape[0], image_src.shape[1], 0, 0
+    start_row = int(rows[0])
+    end_row = int(rows[-1]) + 1
+    start_col = int(np.argmax(mask[start_row]))
+    end_col = image_src.shape[1] - int(np.argmax(mask[end_row - 1][::-1]))
+    return start_row, start_col, end_row, end_col
+
+
+def crop_image(image_src, background=254):
+    start_row, start_col, end_row, end_col = crop_box(image_src, background)
+    return image_src[start_row:end_row, start_col:end_col]
+
+
+def crop_file(args):
+    src_path, dst_path = args
+    image_src = cv2.imread(src_path)
+    box = crop_box(image_src)
+    cv2.imwrite(dst_path, image_src[box[0]:box[2], box[1]:box[3]])
+    return os.path.basename(src_path), box
+
+
+def crop_directory(directory, cut_directory, workers=None, chunksize=4):
+    # crop every figure in directory and write it to cut_directory with a process pool
+    files = sorted(os.listdir(directory))
+    tasks = [(os.path.join(directory, f), os.path.join(cut_directory, f)) for f in files]
+    boxes = {}
+    start = time.time()
+    with Pool(workers) as pool:
+        for name, box in pool.imap_unordered(crop_file, tasks, chunksize=chunksize):
+            boxes[name] = box
+    elapsed = time.time() - start
+    print(len(tasks), 'images cropped in', round(elapsed, 2), 's,',
+          round(len(tasks) / max(elapsed, 1e-9), 2), 'images/s')
+    return boxes
+
+
+if __name__ == '__main__':
+    crop_directory(directory, cut_directory)
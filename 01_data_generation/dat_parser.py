@@ -0,0 +1,125 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# python version: 3.9
+
+"""
+Single-scan parser for the ABAQUS .dat results of the XFEM propagation loop
+The file is streamed line by line and the scan stops as soon as the K1/K2 contour rows and the
+local direction of virtual crack propagation have been found.
+"""
+
+import os
+import re
+import time
+from collections import namedtuple
+from multiprocessing import Pool
+
+K1_MARKER = 'XFEM_1       K1:'
+DIRECTION_MARKER = 'LOCAL DIRECTION OF VIRTUAL CRACK PROPAGATION'
+
+# k1, k2: values of all contours, vector: (x, y, z) local direction of virtual crack propagation
+DatResult = namedtuple('DatResult', ['k1', 'k2', 'vector'])
+
+
+def parse_dat(path):
+    k1 = k2 = vector = None
+    with open(path, 'r') as f:
+        for line in f:
+            if k1 is None and K1_MARKER in line:
+                k1 = tuple(float(v) for v in line.split()[2:])
+                k2 = tuple(float(v) for v in next(f).split()[1:])
+            elif vector is None and DIRECTION_MARKER in line:
+                s = line.split()
+                vector = (float(s[-3]), float(s[-2]), float(s[-1]))
+            if k1 is not None and vector is not None:
+                break
+    if k1 is None or vector is None:
+        raise ValueError(path + ' does not contain the SIF table or the crack direction')
+    return DatResult(k1, k2, vector)
+
+
+def averaged_sif(result, first=1, last=5):
+    # KI and KII averaged over contours 2-5, the first contour is not path independent
+    SIFI = sum(result.k1[first:last]) / float(last - first)
+    SIFII = sum(result.k2[first:last]) / float(last - first)
+    return SIFI, SIFII
+
+
+def increment_number(file_name):
+    # 'Sample3Incre12.dat' -> 12
+    return int(re.search(r'Incre(\d+)\.dat$', file_name).group(1))
+
+
+def _parse_increment(path):
+    return increment_number(os.path.basename(path)), parse_dat(path)
+
+
+def parse_sample_directory(directory, workers=None):
+    # parse the .dat file of every increment of a sample in parallel, sorted by increment
+    paths = [os.path.join(directory, f) for f in os.listdir(directory) if re.search(r'Incre\d+\.dat$', f)]
+    with Pool(workers) as pool:
+        results = pool.map(_parse_increment, paths)
+    return sorted(results)
+
+
+def read_legacy(abs_path):
+    # previous implementation of read() in main-v1.1.py, kept for the benchmark
+    f = open(abs_path, "r")
+    lines = f.readlines()
+    datContent = [i.strip() for i in lines]
+    for i in datContent:
+        if 'XFEM_1       K1:' in i:
+            row_num = datContent.index(i)
+    SIFI = (float(datContent[row_num].split()[3]) + float(datContent[row_num].split()[4]) + float(
+        datContent[row_num].split()[5]) + float(datContent[row_num].split()[6])) / 4.0
+    SIFII = (float(datContent[row_num + 1].split()[2]) + float(datContent[row_num + 1].split()[3]) + float(
+        datContent[row_num + 1].split()[4]) + float(datContent[row_num + 1].split()[5])) / 4.0
+    for i in datContent:
+        if 'LOCAL DIRECTION OF VIRTUAL CRACK PROPAGATION' in i:
+            row_direction = datContent.index(i)
+            break
+    VECTOR = (float(datContent[row_direction].split()[-3]), float(datContent[row_direction].split()[-2]),
+              float(datContent[row_direction].split()[-1]))
+    f.close()
+    return SIFI, SIFII, VECTOR
+
+
+def write_synthetic_dat(path, num_lines, num_contour=5):
+    # .dat-like file: num_lines of element output, the crack direction and the K-factor table at the end
+    with open(path, 'w') as f:
+        f.write('   Abaqus 2021                                  Date 16-Apr-2022\n')
+        row = '%10d   1  %12.4E  %12.4E  %12.4E  %12.4E\n'
+        for n in range(num_lines):
+            f.write(row % (n + 1, 1.0e2 + n % 97, -3.5e1, 2.0e-3, 0.0))
+        f.write('\n   CRACK NAME: CRACK-1\n\n')
+        f.write('   LOCAL DIRECTION OF VIRTUAL CRACK PROPAGATION   %12.4E  %12.4E  %12.4E\n' % (0.9987, 5.0e-2, 0.0))
+        f.write('\n                     K   F A C T O R       E S T I M A T E S\n\n')
+        f.write('   XFEM_1       K1:' + ''.join('  %12.4E' % (5.0e2 + k) for k in range(num_contour)) + '\n')
+        f.write('                K2:' + ''.join('  %12.4E' % (-1.0e1 - k) for k in range(num_contour)) + '\n')
+        f.write('                K3:' + ''.join('  %12.4E' % 0.0 for k in range(num_contour)) + '\n')
+        f.write('          MTS   DIRECTION (DEG):' + ''.join('  %12.4E' % 1.2 for k in range(num_contour)) + '\n')
+
+
+def benchmark_dat_parser(directory, sizes=(10000, 100000, 1000000), repeats=3):
+    # time read_legacy and parse_dat on synthetic .dat files of increasing size
+    results = []
+    for num_lines in sizes:
+        path = os.path.join(directory, 'synthetic_%d.dat' % num_lines)
+        write_synthetic_dat(path, num_lines)
+        timings = {}
+        for name, func in (('legacy', read_legacy), ('single_scan', lambda p: averaged_sif(parse_dat(p)))):
+            best = float('inf')
+            for _ in range(repeats):
+                start = time.time()
+                func(path)
+                best = min(best, time.time() - start)
+            timings[name] = best
+        results.append((num_lines, timings['legacy'], timings['single_scan']))
+        print('%9d lines: legacy %.3f s, single scan %.3f s, speedup %.1fx' % (
+            num_lines, timings['legacy'], timings['single_scan'], timings['legacy'] / timings['single_scan']))
+        os.remove(path)
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_dat_parser(os.getcwd())
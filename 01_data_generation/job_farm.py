@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# python version: 3.9
+
+"""
+Parallel job farm for the XFEM propagation loop
+Many samples run at the same time under a CPU and license token budget. The state of every sample
+is saved after each increment (state.json next to result.txt), so an interrupted farm resumes the
+samples where they stopped. Failed increments are retried with exponential backoff.
+
+The solver is pluggable: solver(work_directory, model_name, crack_tip, tensile, shear, num_cpus)
+returns (KI, KII, vector). abaqus_solver in main-v1.1.py runs the FE model, StubSolver is a cheap
+local stand-in for testing the scheduler without ABAQUS.
+"""
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import propagation
+
+
+def abaqus_tokens(num_cpus):
+    # ABAQUS analysis license tokens of a job on num_cpus cores
+    return int(5 * num_cpus ** 0.422)
+
+
+class ResourcePool(object):
+    # blocks until both the cores and the license tokens of a job are free
+    def __init__(self, total_cpus, license_tokens=None):
+        self.free_cpus = total_cpus
+        self.free_tokens = float('inf') if license_tokens is None else license_tokens
+        self.condition = threading.Condition()
+
+    def acquire(self, num_cpus, tokens):
+        with self.condition:
+            while self.free_cpus < num_cpus or self.free_tokens < tokens:
+                self.condition.wait()
+            self.free_cpus -= num_cpus
+            self.free_tokens -= tokens
+
+    def release(self, num_cpus, tokens):
+        with self.condition:
+            self.free_cpus += num_cpus
+            self.free_tokens += tokens
+            self.condition.notify_all()
+
+
+class StubSolver(object):
+    # cheap stand-in for the FE solve: SIF of an edge crack under the current load and a propagation
+    # vector along +x; failure_rate makes increments fail at random
+    def __init__(self, duration=0.0, failure_rate=0.0, seed=None):
+        self.duration = duration
+        self.failure_rate = failure_rate
+        self.rng = np.random.RandomState(seed)
+        self.lock = threading.Lock()
+
+    def __call__(self, work_directory, model_name, crack_tip, tensile, shear, num_cpus):
+        with self.lock:
+            fail = self.rng.uniform() < self.failure_rate
+        time.sleep(self.duration)
+        if fail:
+            raise RuntimeError('stub solver failure in ' + model_name)
+        a = crack_tip[-1][0]
+        KI = tensile * math.sqrt(math.pi * a)
+        KII = shear * math.sqrt(math.pi * a) * 0.1
+        return KI, KII, (1.0, 0.0, 0.0)
+
+
+def log_bug(base_directory, sample, state, error):
+    with open(os.path.join(base_directory, 'bug.txt'), 'a') as output_bug:
+        output_bug.write("sample" + str(sample) + "\t" + propagation.model_name(state) + "\t" + repr(error) + "\n")
+
+
+def run_sample(sample, solver, base_directory, resources, num_cpus=5, max_retries=3, backoff=30.0,
+               max_backoff=600.0, seed=None):
+    # # ===== 为每个样本创建一个路径 =====
+    work_directory = os.path.join(base_directory, "sample" + str(sample))
+    if not os.path.isdir(work_directory):
+        os.makedirs(work_directory)
+    state = propagation.load_state(work_directory)
+    if state is None:
+        state = propagation.new_state(sample)
+    rng = np.random.RandomState(None if seed is None else seed + sample)
+    tokens = abaqus_tokens(num_cpus)
+    while state['status'] == 'running':
+        if state['tensile'] is None:
+            propagation.draw_load(state, rng)
+            propagation.save_state(work_directory, state)
+        resources.acquire(num_cpus, tokens)
+        try:
+            KI, KII, vector = solver(work_directory, propagation.model_name(state), state['crack_tip'],
+                                     state['tensile'], state['shear'], num_cpus)
+        except Exception as e:
+            resources.release(num_cpus, tokens)
+            state['attempts'] += 1
+            if state['attempts'] > max_retries:
+                state['status'] = 'failed'
+                log_bug(base_directory, sample, state, e)
+            propagation.save_state(work_directory, state)
+            if state['status'] == 'running':
+                time.sleep(min(backoff * 2 ** (state['attempts'] - 1), max_backoff))
+            continue
+        resources.release(num_cpus, tokens)
+        state['attempts'] = 0
+        try:
+            propagation.advance(state, KI, KII, vector)
+        except (ValueError, ZeroDivisionError, OverflowError) as e:
+            # angle() / tip() fail on a degenerate SIF result (e.g. KI = KII = 0); the same result
+            # would be replayed on every retry, so the sample fails
+            state['status'] = 'failed'
+            log_bug(base_directory, sample, state, e)
+            propagation.save_state(work_directory, state)
+            continue
+        propagation.write_result(work_directory, state)
+        propagation.save_state(work_directory, state)
+    return state
+
+
+def run_farm(samples, solver, base_directory, total_cpus=20, num_cpus=5, license_tokens=None, max_retries=3,
+             backoff=30.0, max_backoff=600.0, seed=None):
+    # run the samples concurrently; finished samples are skipped and interrupted ones resumed
+    # a job that can never fit the budget would block ResourcePool.acquire forever
+    if num_cpus > total_cpus:
+        raise ValueError('num_cpus=%d exceeds total_cpus=%d' % (num_cpus, total_cpus))
+    if license_tokens is not None and abaqus_tokens(num_cpus) > license_tokens:
+        raise ValueError('a job on %d cpus needs %d license tokens, only %d available'
+                         % (num_cpus, abaqus_tokens(num_cpus), license_tokens))
+    resources = ResourcePool(total_cpus, license_tokens)
+    max_jobs = total_cpus // num_cpus
+    if license_tokens is not None:
+        max_jobs = min(max_jobs, license_tokens // abaqus_tokens(num_cpus))
+    start = time.time()
+    with ThreadPoolExecutor(max_jobs) as pool:
+        states = list(pool.map(lambda s: run_sample(s, solver, base_directory, resources, num_cpus, max_retries,
+                                                    backoff, max_backoff, seed), samples))
+    finished = sum(s['status'] == 'finished' for s in states)
+    print(finished, 'of', len(states), 'samples finished in', round(time.time() - start, 2), 's with',
+          max_jobs, 'concurrent jobs')
+    return states
+
+
+if __name__ == '__main__':
+    run_farm(range(1, 31), StubSolver(duration=0.01, failure_rate=0.05, seed=0), 'D:/temp/stub_farm',
+             total_cpus=20, num_cpus=5, backoff=0.1, seed=0)
@@ -1,81 +1,99 @@
 import numpy as np
-from scipy import interpolate
-import matplotlib.pyplot as plt
-import math
-from scipy.interpolate import interpolate
 import os
+import time
+from multiprocessing import Pool
 
 directory = r"D:/Dataset/coordinate"
 cut_directory = "D:/Dataset/life/"
-sample_list = os.listdir(directory)
-os.chdir(directory)
-for sample in sample_list:
-    # read data from a file
-    x = []
-    y = []
-    z = []
-    filename = sample
-    f = open(filename, encoding='utf-8')
-    lines = f.readlines()[2:]
-    for line in lines:
-        s = line.strip().split('\t')
-        x.append(float(s[1]))
-        y.append(float(s[2]))
-        z.append(math.sqrt(float(s[3]) ** 2 + float(s[4]) ** 2))
-
-    f.close()
-
-    x = np.array(x)
-    y = np.array(y)
-    z = np.array(z)
-
-    # fit the path and obtain the crack tip coordinate
-    fit_xy = interpolate.interp1d(x, y, kind='linear')
-    x_tip = np.linspace(1.0, 8.6, 41)
-    y_tip = fit_xy(x_tip)
-
-    # plt.plot(x,y,"k")
-    # plt.plot(x_tip,y_tip,"r*")
-    # plt.show()
 
-    #### ================================= crack length and crack tip ====================================
-    # calculate the crack extension
-    crack_inc = []  # crack increment in each picture
-    crack_length = []  # crack length in each picture (last point)
-    a_sum = 0
-    for j in range(len(x_tip) - 1):
-        crack_inc.append(math.sqrt((x_tip[j + 1] - x_tip[j]) ** 2 + (y_tip[j + 1] - y_tip[j]) ** 2))
-        a_sum = a_sum + math.sqrt((x_tip[j + 1] - x_tip[j]) ** 2 + (y_tip[j + 1] - y_tip[j]) ** 2)
-        crack_length.append(a_sum)
-
-    crack_length_median = []  # crack length in each picture (median point in crack increment)
-    for j in range(len(crack_inc)):
-        crack_length_median.append(crack_length[j] - crack_inc[j] / 2.0)
-
-    # print(crack_inc)
-    # print(crack_length_median)
-    # print(crack_length)
+C_def = 9.7 * 10 ** (-12)
+m_def = 3.0
+x_tip_def = np.linspace(1.0, 8.6, 41)
+
+
+def load_coordinates(path):
+    # bulk parse of a coordinate file (result.txt columns: Incre Tip_x Tip_y KI KII Tensile Shear)
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().split('\n', 2)
+    ncol = len(lines[2].split('\n', 1)[0].split())
+    data = np.array(lines[2].split(), dtype=np.float64).reshape(-1, ncol)
+    x = data[:, 1]
+    y = data[:, 2]
+    z = np.hypot(data[:, 3], data[:, 4])  # effective stress intensity factor
+    return x, y, z
 
+
+def crack_geometry(x, y, z, x_tip=x_tip_def):
+    # crack increment between the crack tips on the x_tip grid and Keff at the middle of every increment
+    if x_tip[0] < x.min() or x_tip[-1] > x.max():
+        raise ValueError('x_tip grid is outside of the crack path')
+    # fit the path and obtain the crack tip coordinate (interp1d sorts by x as well)
+    order = np.argsort(x, kind='mergesort')
+    y_tip = np.interp(x_tip, x[order], y[order])
+    #### ================================= crack length and crack tip ====================================
+    crack_inc = np.hypot(np.diff(x_tip), np.diff(y_tip))  # crack increment in each picture
+    crack_length_median = np.cumsum(crack_inc) - crack_inc / 2.0  # median point in crack increment
     #### ================================= stress intensity factor ====================================
-    a_sum = 0
-    new_x = [0, ]  # 裂纹长度
-    new_y = [z[0], ]  # 有效应力强度因子
-    for j in range(len(x) - 1):
-        a_sum = a_sum + math.sqrt((x[j + 1] - x[j]) ** 2 + (y[j + 1] - y[j]) ** 2)
-        new_x.append(a_sum)
-        new_y.append(z[j + 1])
-
-    f = interpolate.interp1d(new_x, new_y, kind='linear')
-    Keff = f(crack_length_median)
-
-    #### ================================= life ====================================
-    C = 9.7 * 10 ** (-12)
-    m = 3.0
-    N = []
-    for j in range(len(crack_length_median)):
-        N.append(int(crack_inc[j] / C / (Keff[j]) ** m))
-
-    fout = open(cut_directory+filename,"w")
-    for j in range(len(crack_length_median)):
-        fout.write(str(j+1)+"\t"+str(N[j])+"\n")
-    fout.close()
+    new_x = np.concatenate(([0.0], np.cumsum(np.hypot(np.diff(x), np.diff(y)))))  # 裂纹长度
+    if crack_length_median[-1] > new_x[-1]:
+        raise ValueError('x_tip grid is longer than the crack path')
+    Keff = np.interp(crack_length_median, new_x, z)  # 有效应力强度因子
+    return crack_inc, Keff
+
+
+def paris_life(crack_inc, Keff, C=C_def, m=m_def):
+    # N = Δa / (C·Keff^m), broadcasts over C and m, e.g. C[:, None, None] for a sweep
+    return np.trunc(crack_inc / C / Keff ** m)
+
+
+def process_chunk(args):
+    paths, x_tip = args
+    names, incs, keffs = [], [], []
+    for path in paths:
+        try:
+            crack_inc, Keff = crack_geometry(*load_coordinates(path), x_tip=x_tip)
+        except (ValueError, IndexError) as e:
+            print(os.path.basename(path), 'skipped:', e)
+            continue
+        names.append(os.path.basename(path))
+        incs.append(crack_inc)
+        keffs.append(Keff)
+    return names, incs, keffs
+
+
+def compute_geometry(directory, x_tip=x_tip_def, workers=None, chunk=256):
+    # crack increments and Keff of every sample, (samples, len(x_tip) - 1) arrays
+    paths = [os.path.join(directory, s) for s in sorted(os.listdir(directory))]
+    chunks = [(paths[k:k + chunk], x_tip) for k in range(0, len(paths), chunk)]
+    names, incs, keffs = [], [], []
+    with Pool(workers) as pool:
+        for n, i, k in pool.imap(process_chunk, chunks):
+            names.extend(n)
+            incs.extend(i)
+            keffs.extend(k)
+    n_inc = len(x_tip) - 1
+    crack_inc = np.array(incs).reshape(-1, n_inc)
+    Keff = np.array(keffs).reshape(-1, n_inc)
+    return names, crack_inc, Keff
+
+
+def write_sample_files(cut_directory, names, N):
+    # one file per sample in the original format: increment \t life
+    for name, life in zip(names, N.astype(np.int64)):
+        with open(os.path.join(cut_directory, name), 'w') as fout:
+            fout.write(''.join('%d\t%d\n' % (j + 1, n) for j, n in enumerate(life)))
+
+
+def compute_life(directory, output, C=C_def, m=m_def, x_tip=x_tip_def, workers=None):
+    # life of all samples written to one consolidated .npz file
+    start = time.time()
+    names, crack_inc, Keff = compute_geometry(directory, x_tip, workers)
+    N = paris_life(crack_inc, Keff, C, m)
+    np.savez(output, samples=np.array(names), life=N, crack_inc=crack_inc, Keff=Keff, x_tip=x_tip, C=C, m=m)
+    print(len(names), 'samples computed in', round(time.time() - start, 2), 's')
+    return names, N
+
+
+if __name__ == '__main__':
+    names, N = compute_life(directory, os.path.join(cut_directory, 'life.npz'))
+    write_sample_files(cut_directory, names, N)
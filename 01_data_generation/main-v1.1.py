@@ -9,17 +9,36 @@ Date: 2022-4-16
 Compared with v1.0, this version using the crack length increment instead of x-increment.Besides, try...except is used to avoid the stop of loop when abaqus is aborted
 """
 
-import math
-import numpy as np
 from abaqus import mdb, session
 import regionToolset, displayGroupMdbToolset as dgm, part, assembly, step, interaction, load, mesh, job, \
     connectorBehavior
 from abaqusConstants import *
 import os
+import sys
+
+try:
+    script_directory = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    script_directory = os.getcwd()
+sys.path.append(script_directory)
+from dat_parser import parse_dat, averaged_sif
+from propagation import width_def, height_def
+from job_farm import run_farm
+import threading
+
+# # ===== Constant Parameters =====
+thickness_def = 0.1  # 板厚名称
+part_name_def = 'plate'  # 平板名称
+mat_name_def = 'Ni'  # 材料名称
+num_contour_def = 5  # 围道数量
+element_size_def = 0.11  # 网格尺寸
+elastic_mod_def = 200000
+nu_def = 0.31
+cae_lock = threading.Lock()
 
 
 def model(width, height, thickness, crack_tip, model_name, part_name, mat_name, elastic_mod, nu, num_contour,
-          tensile_load, shear_load, element_size):
+          tensile_load, shear_load, element_size, num_cpus=5, wait=True):
     # ==== create new CAE ====
     myModel = mdb.Model(name=model_name, modelType=STANDARD_EXPLICIT)
     # ======================= Create plate part ===========================
@@ -109,8 +128,10 @@ def model(width, height, thickness, crack_tip, model_name, part_name, mat_name,
                     getMemoryFromAnalysis=True, explicitPrecision=SINGLE,
                     nodalOutputPrecision=SINGLE, echoPrint=OFF, modelPrint=OFF,
                     contactPrint=OFF, historyPrint=OFF, userSubroutine='', scratch='',
-                    resultsFormat=ODB, multiprocessingMode=DEFAULT, numCpus=5, numDomains=5)
+                    resultsFormat=ODB, multiprocessingMode=DEFAULT, numCpus=num_cpus, numDomains=num_cpus)
     myJob.submit(consistencyChecking=OFF)
+    if not wait:
+        return myJob
     myJob.waitForCompletion()
     # messageType = myJob.messages[(-1)].type
     # if messageType == ABORTED or messageType == ERROR:
@@ -122,136 +143,36 @@ def model(width, height, thickness, crack_tip, model_name, part_name, mat_name,
 def read(wd, model_name):
     file_name = model_name + ".dat"
     abs_path = os.path.join(wd, file_name)
-    f = open(abs_path, "r")
-    lines = f.readlines()
-    datContent = [i.strip() for i in lines]
-    #  =======================      read SIF      ==============================
-    for i in datContent:
-        if 'XFEM_1       K1:' in i:
-            row_num = datContent.index(i)
-    SIFI = (float(datContent[row_num].split()[3]) + float(datContent[row_num].split()[4]) + float(
-        datContent[row_num].split()[5]) + float(datContent[row_num].split()[6])) / 4.0
-    SIFII = (float(datContent[row_num + 1].split()[2]) + float(datContent[row_num + 1].split()[3]) + float(
-        datContent[row_num + 1].split()[4]) + float(datContent[row_num + 1].split()[5])) / 4.0
-    #  ====================    read crack vector     ==============================
-    for i in datContent:
-        if 'LOCAL DIRECTION OF VIRTUAL CRACK PROPAGATION' in i:
-            row_direction = datContent.index(i)
-            break
-    VECTOR = (float(datContent[row_direction].split()[-3]), float(datContent[row_direction].split()[-2]),
-              float(datContent[row_direction].split()[-1]))
-    f.close()
+    #  =======================      read SIF and crack vector (single scan)     ==============================
+    result = parse_dat(abs_path)
+    SIFI, SIFII = averaged_sif(result)
+    VECTOR = result.vector
     return SIFI, SIFII, VECTOR
 
 
-def angle(KI, KII, vector):
-    # calculate the current crack propagation angle
-    # 逆时针为正，顺时针为负
-    cur_angle = math.degrees(
-        math.atan2(vector[1], vector[0]))  # the first parameter-y, the second-x. obtain the angle with positive x
-    # 根据KII判断偏转角度正负，KII<0,相对于原扩展方向顺时针旋转，deflect_angle<0; KII>0, deflect_angle>0 (与ABAQUS中的定义相反）
-    if KII >= 0:
-        deflect_angle = math.acos(
-            (3 * KII ** 2 + math.sqrt(KI ** 4 + 8 * KI ** 2 * KII ** 2)) / (KI ** 2 + 9 * KII ** 2))
-        deflect_angle = math.degrees(deflect_angle)
-    else:
-        deflect_angle = -math.acos(
-            (3 * KII ** 2 + math.sqrt(KI ** 4 + 8 * KI ** 2 * KII ** 2)) / (KI ** 2 + 9 * KII ** 2))
-        deflect_angle = math.degrees(deflect_angle)
-    global_angle = cur_angle + deflect_angle
-    print('cur:', cur_angle)
-    return global_angle
-
-
-def tip(crack_tip, angle_global, delta_a):
-    original_x = crack_tip[-1][0]
-    original_y = crack_tip[-1][1]
-    new_x = original_x + delta_a * math.cos(math.radians(angle_global))
-    new_y = original_y + delta_a * math.sin(math.radians(angle_global))
-    new_tip = (new_x, new_y)
-    return new_tip
+def abaqus_solver(work_directory, model_name, crack_tip, tensile_load, shear_load, num_cpus):
+    # solver of the job farm: build and submit under the CAE lock (the job is written to the current
+    # directory), then wait for the analysis outside of it so that several jobs run at the same time
+    with cae_lock:
+        os.chdir(work_directory)
+        myJob = model(width_def, height_def, thickness_def, [tuple(p) for p in crack_tip], model_name, part_name_def,
+                      mat_name_def, elastic_mod_def, nu_def, num_contour_def, tensile_load, shear_load,
+                      element_size_def, num_cpus=num_cpus, wait=False)
+    myJob.waitForCompletion()
+    try:
+        return read(work_directory, model_name)
+    finally:
+        with cae_lock:
+            del mdb.models[model_name]
 
 
 if __name__ == '__main__':
-    # # ===== Constant Parameters =====
-    width_def = 10  # 板宽
-    height_def = 20  # 板高
-    thickness_def = 0.1  # 板厚名称
-    part_name_def = 'plate'  # 平板名称
-    mat_name_def = 'Ni'  # 材料名称
-    num_contour_def = 5  # 围道数量
-    element_size_def = 0.11  # 网格尺寸
-    delta_a = 0.3  # 裂纹扩展增量
-    num_sample = 1  # 需要模拟的路径个数
-    x_boundary = 9.0  # x方向的边界
-    ymin_boundary = 0.0  # y方向最小值
-    ymax_boundary = height_def  # y方向最大值
     # # ==== 根工作目录 ====
     base_directory = "D:/temp/ABAQUS2021/xfemV1-1/"
     # # ==== 样本控制参数 ====
     total_sample = 30  # 样本数量
-    for i in range(1, total_sample + 1):
-        # # ===== 为每个样本创建一个路径 =====
-        work_directory = base_directory + "sample" + str(i)
-        os.mkdir(work_directory)
-        os.chdir(work_directory)
-        Mdb()
-        # # ===== 每个样本之间变化的参数 =====
-        boundary_flag = True  # 用于判断当前样本是否结束
-        load_boundary_flag = True  # 用于判断载荷是否变化
-        ith_sample = 1  # 当前是第i个样本
-        increment = 0  # 当前是第i个样本的第increment扩展步
-        load_boundary = 2.0  # 用于判断裂纹尖端是否到底载荷边界
-        num_load = 8  # 载荷变化次数
-        crack_tip_def = [(0.0, 10.0), (1.0, 10.0)]
-        elastic_mod_def = 200000
-        nu_def = 0.31
-        # # ===== 输出结果到result.txt文件中
-        output = open('result.txt', 'w')
-        output.write("sample" + str(i) + "\n")
-        output.write("Incre\tTip_x\tTip_y\tKI\tKII\tTensile\tShear\n")
-        while boundary_flag:
-            # # ==== 在载荷变化时需要改变的参数 ====
-            tensile_load_def = float(np.random.normal(loc=200.0, scale=50.0, size=1))  # 高斯分布-拉伸载荷
-            shear_load_def = float(np.random.normal(loc=100.0, scale=50.0, size=1))  # 高斯分布-剪切载荷
-            while load_boundary_flag:
-                try:
-                    # # ===== Build FE Model =====
-                    model_name_def = 'Sample' + str(i) + 'Incre' + str(increment)
-                    model(width_def, height_def, thickness_def, crack_tip_def, model_name_def, part_name_def, mat_name_def,
-                          elastic_mod_def, nu_def, num_contour_def, tensile_load_def, shear_load_def, element_size_def)
-                    # # ==== Read the Calculated SIF ====
-                    KI, KII, vector = read(work_directory, model_name_def)
-                    # # ==== Calculate the angle ====
-                    angle_global = angle(KI, KII, vector)
-                    # # ==== Calculate the new crack tip ====
-                    crack_tip_def.append(tip(crack_tip_def, angle_global, delta_a))
-                    # # ==== Output the result of each increment ====
-                    output.write(
-                        str(increment) + "\t" + str(crack_tip_def[-2][0]) + "\t" + str(crack_tip_def[-2][1]) + "\t" + str(
-                            KI) + "\t" + str(KII) + "\t" + str(tensile_load_def) + "\t" + str(shear_load_def) + "\n")
-                    # # ==== Judge the crack tip and geometry boundary ====
-                    if (crack_tip_def[-1][0] > x_boundary) or (crack_tip_def[-1][1] < ymin_boundary) or (
-                            crack_tip_def[-1][1] > ymax_boundary):
-                        print('The crack has reached the defined boundary and this sample is finished')
-                        boundary_flag = False
-                        break
-                    else:
-                        increment = increment + 1
-                        if crack_tip_def[-1][0] < load_boundary:
-                            continue
-                        else:
-                            print('the crack has reached the load boundary and the load will be changed')
-                            load_boundary = load_boundary + 1.0
-                            break
-                except:
-                    output_bug = open("D:/temp/ABAQUS2021/xfemV1-1/bug.txt",'a')
-                    output_bug.write("sample" + str(i) + "\n")
-                    output_bug.close()
-                    boundary_flag = False
-                    break
-        # save the cae file
-        cae_name = "sample" + str(i)
-        path_name = os.path.join(work_directory, cae_name)
-        output.close()
-        mdb.saveAs(pathName=path_name)
+    total_cpus = 20  # 可用CPU核数
+    num_cpus = 5  # 每个作业的CPU核数
+    license_tokens = None  # 可用的license token数量, None表示不限制
+    run_farm(range(1, total_sample + 1), abaqus_solver, base_directory, total_cpus=total_cpus, num_cpus=num_cpus,
+             license_tokens=license_tokens, max_retries=3, backoff=30.0)
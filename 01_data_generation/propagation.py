@@ -0,0 +1,139 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# python version: 3.9
+
+"""
+Crack propagation rules of the XFEM loop, free of ABAQUS imports
+The state of a sample (crack tip list, current load pair, load_boundary, increment and the rows
+of result.txt) is a plain dict so that it can be saved after every increment and resumed.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+# # ===== Constant Parameters =====
+width_def = 10  # 板宽
+height_def = 20  # 板高
+delta_a = 0.3  # 裂纹扩展增量
+x_boundary = 9.0  # x方向的边界
+ymin_boundary = 0.0  # y方向最小值
+ymax_boundary = height_def  # y方向最大值
+crack_tip_init = [(0.0, 10.0), (1.0, 10.0)]
+load_boundary_init = 2.0  # 用于判断裂纹尖端是否到底载荷边界
+tensile_dist = (200.0, 50.0)  # 高斯分布-拉伸载荷
+shear_dist = (100.0, 50.0)  # 高斯分布-剪切载荷
+
+RESULT_HEADER = "Incre\tTip_x\tTip_y\tKI\tKII\tTensile\tShear\n"
+
+
+def angle(KI, KII, vector):
+    # calculate the current crack propagation angle
+    # 逆时针为正，顺时针为负
+    cur_angle = math.degrees(
+        math.atan2(vector[1], vector[0]))  # the first parameter-y, the second-x. obtain the angle with positive x
+    # 根据KII判断偏转角度正负，KII<0,相对于原扩展方向顺时针旋转，deflect_angle<0; KII>0, deflect_angle>0 (与ABAQUS中的定义相反）
+    if KII >= 0:
+        deflect_angle = math.acos(
+            (3 * KII ** 2 + math.sqrt(KI ** 4 + 8 * KI ** 2 * KII ** 2)) / (KI ** 2 + 9 * KII ** 2))
+        deflect_angle = math.degrees(deflect_angle)
+    else:
+        deflect_angle = -math.acos(
+            (3 * KII ** 2 + math.sqrt(KI ** 4 + 8 * KI ** 2 * KII ** 2)) / (KI ** 2 + 9 * KII ** 2))
+        deflect_angle = math.degrees(deflect_angle)
+    global_angle = cur_angle + deflect_angle
+    print('cur:', cur_angle)
+    return global_angle
+
+
+def tip(crack_tip, angle_global, delta_a):
+    original_x = crack_tip[-1][0]
+    original_y = crack_tip[-1][1]
+    new_x = original_x + delta_a * math.cos(math.radians(angle_global))
+    new_y = original_y + delta_a * math.sin(math.radians(angle_global))
+    new_tip = (new_x, new_y)
+    return new_tip
+
+
+def angle_batch(KI, KII, vector):
+    # angle() for arrays of crack tips, vector: (n, 2) or (n, 3)
+    KI = np.asarray(KI, dtype=np.float64)
+    KII = np.asarray(KII, dtype=np.float64)
+    vector = np.asarray(vector, dtype=np.float64)
+    cur_angle = np.degrees(np.arctan2(vector[:, 1], vector[:, 0]))
+    cos_deflect = (3 * KII ** 2 + np.sqrt(KI ** 4 + 8 * KI ** 2 * KII ** 2)) / (KI ** 2 + 9 * KII ** 2)
+    deflect_angle = np.degrees(np.arccos(np.clip(cos_deflect, -1.0, 1.0)))
+    return cur_angle + np.where(KII >= 0, deflect_angle, -deflect_angle)
+
+
+def tip_batch(crack_tip, angle_global, delta_a):
+    # tip() for arrays of crack tips, crack_tip: (n, 2) current tips
+    rad = np.radians(angle_global)
+    return crack_tip + delta_a * np.stack([np.cos(rad), np.sin(rad)], axis=-1)
+
+
+def new_state(sample):
+    return {'sample': sample, 'increment': 0, 'crack_tip': [list(p) for p in crack_tip_init],
+            'tensile': None, 'shear': None, 'load_boundary': load_boundary_init,
+            'rows': [], 'status': 'running', 'attempts': 0}
+
+
+def draw_load(state, rng=np.random):
+    # # ==== 在载荷变化时需要改变的参数 ====
+    state['tensile'] = float(rng.normal(loc=tensile_dist[0], scale=tensile_dist[1]))
+    state['shear'] = float(rng.normal(loc=shear_dist[0], scale=shear_dist[1]))
+
+
+def model_name(state):
+    return 'Sample' + str(state['sample']) + 'Incre' + str(state['increment'])
+
+
+def advance(state, KI, KII, vector):
+    # one increment of the propagation loop of main-v1.1.py applied to the state
+    # # ==== Calculate the angle ====
+    angle_global = angle(KI, KII, vector)
+    # # ==== Calculate the new crack tip ====
+    state['crack_tip'].append(list(tip(state['crack_tip'], angle_global, delta_a)))
+    # # ==== Output the result of each increment ====
+    state['rows'].append([state['increment'], state['crack_tip'][-2][0], state['crack_tip'][-2][1],
+                          KI, KII, state['tensile'], state['shear']])
+    # # ==== Judge the crack tip and geometry boundary ====
+    new_x, new_y = state['crack_tip'][-1]
+    if (new_x > x_boundary) or (new_y < ymin_boundary) or (new_y > ymax_boundary):
+        print('The crack has reached the defined boundary and this sample is finished')
+        state['status'] = 'finished'
+        return state
+    state['increment'] = state['increment'] + 1
+    if new_x >= state['load_boundary']:
+        print('the crack has reached the load boundary and the load will be changed')
+        state['load_boundary'] = state['load_boundary'] + 1.0
+        state['tensile'] = state['shear'] = None
+    return state
+
+
+def write_atomic(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_result(work_directory, state):
+    # # ===== 输出结果到result.txt文件中
+    lines = ["sample" + str(state['sample']) + "\n", RESULT_HEADER]
+    lines.extend("\t".join(str(v) for v in row) + "\n" for row in state['rows'])
+    write_atomic(os.path.join(work_directory, 'result.txt'), ''.join(lines))
+
+
+def save_state(work_directory, state):
+    write_atomic(os.path.join(work_directory, 'state.json'), json.dumps(state))
+
+
+def load_state(work_directory):
+    path = os.path.join(work_directory, 'state.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
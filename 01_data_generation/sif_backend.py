@@ -0,0 +1,230 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# python version: 3.9
+
+"""
+Pluggable SIF backends for the crack propagation loop
+A backend maps arrays of crack tips and loads to (KI, KII, vector) without an FE solve:
+backend(crack_tip_prev, crack_tip, tensile, shear) with (n, 2) tips and (n,) loads returns
+KI (n,), KII (n,) and vector (n, 3), so thousands of paths advance at once through angle_batch().
+KII follows the sign convention of angle(): KII > 0 deflects the crack counterclockwise.
+"""
+
+import math
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+import propagation
+
+
+def crack_direction(crack_tip_prev, crack_tip):
+    d = np.asarray(crack_tip, dtype=np.float64) - np.asarray(crack_tip_prev, dtype=np.float64)
+    return np.arctan2(d[:, 1], d[:, 0])
+
+
+def edge_crack_factor(a, width):
+    # geometry factor of a single edge crack in a finite-width plate (valid up to a/W ~ 0.6)
+    r = a / width
+    return 1.12 - 0.231 * r + 10.55 * r ** 2 - 21.72 * r ** 3 + 30.39 * r ** 4
+
+
+class SIFBackend(object):
+    def __call__(self, crack_tip_prev, crack_tip, tensile, shear):
+        raise NotImplementedError
+
+    def solver(self, work_directory, model_name, crack_tip, tensile, shear, num_cpus):
+        # scalar solver for job_farm.run_farm
+        KI, KII, vector = self(np.array([crack_tip[-2]]), np.array([crack_tip[-1]]),
+                               np.array([tensile]), np.array([shear]))
+        return float(KI[0]), float(KII[0]), tuple(vector[0].tolist())
+
+
+class AnalyticalSIF(SIFBackend):
+    # closed-form mixed-mode estimate for the edge-cracked plate: the far-field tension (y) and
+    # shear (xy) are resolved on the plane of the last crack segment, a is the projected length
+    def __init__(self, width=propagation.width_def):
+        self.width = width
+
+    def __call__(self, crack_tip_prev, crack_tip, tensile, shear):
+        theta = crack_direction(crack_tip_prev, crack_tip)
+        c, s = np.cos(theta), np.sin(theta)
+        a = np.maximum(np.asarray(crack_tip, dtype=np.float64)[:, 0], 1e-6)
+        root = edge_crack_factor(a, self.width) * np.sqrt(math.pi * a)
+        sigma_nn = tensile * c ** 2 - 2 * shear * s * c
+        sigma_nt = shear * (c ** 2 - s ** 2) + tensile * s * c
+        KI = root * sigma_nn
+        KII = -root * sigma_nt  # angle() deflects counterclockwise for KII > 0
+        vector = np.stack([c, s, np.zeros_like(c)], axis=1)
+        return KI, KII, vector
+
+
+def regression_features(crack_tip_prev, crack_tip, tensile, shear, width):
+    # sqrt(pi a) * polynomial in a/W * resolved load terms
+    theta = crack_direction(crack_tip_prev, crack_tip)
+    c, s = np.cos(theta), np.sin(theta)
+    a = np.maximum(np.asarray(crack_tip, dtype=np.float64)[:, 0], 1e-6)
+    r = a / width
+    load = np.stack([tensile * c ** 2, tensile * s * c, shear * (c ** 2 - s ** 2), shear * s * c], axis=1)
+    poly = np.stack([r ** k for k in range(5)], axis=1)
+    return np.sqrt(math.pi * a)[:, None] * (poly[:, :, None] * load[:, None, :]).reshape(len(a), -1)
+
+
+def load_histories(base_directory):
+    # all result.txt rows of base_directory/sampleN as arrays (previous tip, tip, tensile, shear, KI, KII)
+    prev, tips, tensile, shear, KI, KII = [], [], [], [], [], []
+    for sample in sorted(os.listdir(base_directory)):
+        path = os.path.join(base_directory, sample, 'result.txt')
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            data = np.array(f.read().split('\n', 2)[2].split(), dtype=np.float64).reshape(-1, 7)
+        xy = data[:, 1:3]
+        prev.append(np.vstack([propagation.crack_tip_init[0], xy[:-1]]))
+        tips.append(xy)
+        KI.append(data[:, 3])
+        KII.append(data[:, 4])
+        tensile.append(data[:, 5])
+        shear.append(data[:, 6])
+    return (np.vstack(prev), np.vstack(tips), np.concatenate(tensile), np.concatenate(shear),
+            np.concatenate(KI), np.concatenate(KII))
+
+
+class RegressionSIF(SIFBackend):
+    # linear least-squares surrogate trained on the result.txt histories of FE samples
+    def __init__(self, coef_KI, coef_KII, width=propagation.width_def):
+        self.coef_KI = np.asarray(coef_KI)
+        self.coef_KII = np.asarray(coef_KII)
+        self.width = width
+
+    @classmethod
+    def fit(cls, base_directory, width=propagation.width_def):
+        prev, tips, tensile, shear, KI, KII = load_histories(base_directory)
+        X = regression_features(prev, tips, tensile, shear, width)
+        coef_KI = np.linalg.lstsq(X, KI, rcond=None)[0]
+        coef_KII = np.linalg.lstsq(X, KII, rcond=None)[0]
+        backend = cls(coef_KI, coef_KII, width)
+        pred_KI, pred_KII, _ = backend(prev, tips, tensile, shear)
+        print('fitted on', len(KI), 'increments, RMSE KI', np.sqrt(np.mean((pred_KI - KI) ** 2)),
+              'KII', np.sqrt(np.mean((pred_KII - KII) ** 2)))
+        return backend
+
+    def save(self, path):
+        np.savez(path, coef_KI=self.coef_KI, coef_KII=self.coef_KII, width=self.width)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['coef_KI'], data['coef_KII'], float(data['width']))
+
+    def __call__(self, crack_tip_prev, crack_tip, tensile, shear):
+        X = regression_features(crack_tip_prev, crack_tip, tensile, shear, self.width)
+        theta = crack_direction(crack_tip_prev, crack_tip)
+        vector = np.stack([np.cos(theta), np.sin(theta), np.zeros_like(theta)], axis=1)
+        return X.dot(self.coef_KI), X.dot(self.coef_KII), vector
+
+
+def propagate_paths(backend, n_paths, seed=None, max_steps=200):
+    # the propagation loop of main-v1.1.py for n_paths samples at once, every iteration advances
+    # all active paths by one increment; the loads are redrawn when a tip passes its load boundary
+    rng = np.random.RandomState(seed)
+    tips = np.full((n_paths, max_steps + 2, 2), np.nan)
+    tips[:, 0] = propagation.crack_tip_init[0]
+    tips[:, 1] = propagation.crack_tip_init[1]
+    KI = np.full((n_paths, max_steps), np.nan)
+    KII = np.full((n_paths, max_steps), np.nan)
+    tensile = np.full((n_paths, max_steps), np.nan)
+    shear = np.full((n_paths, max_steps), np.nan)
+    cur_tensile = np.full(n_paths, np.nan)
+    cur_shear = np.full(n_paths, np.nan)
+    load_boundary = np.full(n_paths, propagation.load_boundary_init)
+    n_rows = np.zeros(n_paths, dtype=np.int64)
+    active = np.ones(n_paths, dtype=bool)
+    for step in range(max_steps):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        redraw = idx[np.isnan(cur_tensile[idx])]
+        cur_tensile[redraw] = rng.normal(propagation.tensile_dist[0], propagation.tensile_dist[1], redraw.size)
+        cur_shear[redraw] = rng.normal(propagation.shear_dist[0], propagation.shear_dist[1], redraw.size)
+        k1, k2, vector = backend(tips[idx, step], tips[idx, step + 1], cur_tensile[idx], cur_shear[idx])
+        new_tip = propagation.tip_batch(tips[idx, step + 1], propagation.angle_batch(k1, k2, vector),
+                                        propagation.delta_a)
+        tips[idx, step + 2] = new_tip
+        KI[idx, step] = k1
+        KII[idx, step] = k2
+        tensile[idx, step] = cur_tensile[idx]
+        shear[idx, step] = cur_shear[idx]
+        n_rows[idx] += 1
+        finished = ((new_tip[:, 0] > propagation.x_boundary) | (new_tip[:, 1] < propagation.ymin_boundary) |
+                    (new_tip[:, 1] > propagation.ymax_boundary))
+        active[idx[finished]] = False
+        change = idx[~finished & (new_tip[:, 0] >= load_boundary[idx])]
+        load_boundary[change] += 1.0
+        cur_tensile[change] = np.nan
+        cur_shear[change] = np.nan
+    if active.any():
+        print(int(active.sum()), 'paths did not reach the boundary within', max_steps, 'increments')
+    return {'tips': tips, 'KI': KI, 'KII': KII, 'tensile': tensile, 'shear': shear, 'n_rows': n_rows,
+            'finished': ~active}
+
+
+def result_text(sample, tips, KI, KII, tensile, shear, n_rows):
+    # result.txt of one path, same columns as main-v1.1.py
+    lines = ["sample" + str(sample) + "\n", propagation.RESULT_HEADER]
+    for k in range(n_rows):
+        lines.append("\t".join(str(v) for v in [k, float(tips[k + 1, 0]), float(tips[k + 1, 1]), float(KI[k]),
+                                                float(KII[k]), float(tensile[k]), float(shear[k])]) + "\n")
+    return ''.join(lines)
+
+
+def _write_chunk(args):
+    base_directory, first_sample, chunk = args
+    for p in range(len(chunk['n_rows'])):
+        if not chunk['finished'][p]:
+            continue
+        work_directory = os.path.join(base_directory, "sample" + str(first_sample + p))
+        if not os.path.isdir(work_directory):
+            os.makedirs(work_directory)
+        with open(os.path.join(work_directory, 'result.txt'), 'w') as f:
+            f.write(result_text(first_sample + p, chunk['tips'][p], chunk['KI'][p], chunk['KII'][p],
+                                chunk['tensile'][p], chunk['shear'][p], chunk['n_rows'][p]))
+
+
+def write_tasks(base_directory, paths, first_sample=1, chunk=1000):
+    n_paths = len(paths['n_rows'])
+    return [(base_directory, first_sample + k, {key: v[k:k + chunk] for key, v in paths.items()})
+            for k in range(0, n_paths, chunk)]
+
+
+def write_results(base_directory, paths, first_sample=1, workers=None, chunk=1000):
+    # base_directory/sampleN/result.txt for every finished path, written in parallel chunks
+    with Pool(workers) as pool:
+        pool.map(_write_chunk, write_tasks(base_directory, paths, first_sample, chunk))
+
+
+def generate_paths(backend, base_directory, n_paths, path_chunk=10000, seed=None, max_steps=200, first_sample=1,
+                   workers=None):
+    # propagate n_paths in chunks of path_chunk and stream every chunk to result.txt files while the
+    # next one is propagated, memory stays bounded by two chunks (chunk k is seeded with seed + k)
+    start = time.time()
+    finished = 0
+    pending = None
+    with Pool(workers) as pool:
+        for k, offset in enumerate(range(0, n_paths, path_chunk)):
+            paths = propagate_paths(backend, min(path_chunk, n_paths - offset),
+                                    None if seed is None else seed + k, max_steps)
+            finished += int(paths['finished'].sum())
+            if pending is not None:
+                pending.get()
+            pending = pool.map_async(_write_chunk, write_tasks(base_directory, paths, first_sample + offset))
+        if pending is not None:
+            pending.get()
+    print(finished, 'of', n_paths, 'paths propagated and written in', round(time.time() - start, 2), 's')
+    return finished
+
+
+if __name__ == '__main__':
+    generate_paths(AnalyticalSIF(), 'D:/Dataset/analytical_xfem', 1000000, seed=0)
@@ -0,0 +1,107 @@
+# encoding:utf-8
+"""
+Packed frame store: one uint8 array of shape (samples, frames, 92, 136) plus a sample/frame index
+<path>/frames.npy   the pixels, opened through np.memmap (zero copy)
+<path>/index.json   sample names and frame names
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from pipeline import frame_key, sample_key
+
+
+class FrameStore(object):
+    def __init__(self, path, mode='r'):
+        self.path = path
+        with open(os.path.join(path, 'index.json'), encoding='utf-8') as f:
+            index = json.load(f)
+        self.samples = index['samples']
+        self.frames = index['frames']
+        self.array = np.load(os.path.join(path, 'frames.npy'), mmap_mode=mode)
+        self._sample_index = {name: k for k, name in enumerate(self.samples)}
+        self._frame_index = {name: k for k, name in enumerate(self.frames)}
+
+    @classmethod
+    def create(cls, path, samples, frames, height=92, width=136):
+        os.makedirs(path, exist_ok=True)
+        samples = [str(s) for s in samples]
+        frames = [str(f) for f in frames]
+        np.lib.format.open_memmap(os.path.join(path, 'frames.npy'), mode='w+', dtype=np.uint8,
+                                  shape=(len(samples), len(frames), height, width)).flush()
+        with open(os.path.join(path, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump({'samples': samples, 'frames': frames}, f)
+        return cls(path, mode='r+')
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, i):
+        # all frames of the i-th sample, shape (frames, height, width)
+        return self.array[i]
+
+    def sample_index(self, sample):
+        return self._sample_index[str(sample)]
+
+    def frame_index(self, frame):
+        return self._frame_index[str(frame)]
+
+    def sample(self, sample):
+        return self.array[self.sample_index(sample)]
+
+    def get(self, sample, frame):
+        return self.array[self.sample_index(sample), self.frame_index(frame)]
+
+    def frame_pairs(self):
+        # (sample index, frame index) of every stored frame, sample-major
+        s_idx, f_idx = np.meshgrid(np.arange(len(self.samples)), np.arange(len(self.frames)), indexing='ij')
+        return s_idx.ravel(), f_idx.ravel()
+
+    def flush(self):
+        if isinstance(self.array, np.memmap):
+            self.array.flush()
+
+
+def read_frame(path):
+    # same conversion as the notebooks (imread + COLOR_RGB2GRAY)
+    img = cv2.imread(path)
+    if img is None:
+        raise IOError('cannot read ' + path)
+    return cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+
+
+def import_png_tree(src_dir, path, workers=8):
+    # SampleN/<frame>.png -> FrameStore; every sample has to contain the same frame names
+    samples = sorted((s for s in os.listdir(src_dir) if os.path.isdir(os.path.join(src_dir, s))), key=sample_key)
+    frames = [os.path.splitext(f)[0] for f in sorted(os.listdir(os.path.join(src_dir, samples[0])), key=frame_key)]
+    for s in samples:
+        names = sorted(os.path.splitext(f)[0] for f in os.listdir(os.path.join(src_dir, s)))
+        if names != sorted(frames):
+            raise ValueError(s + ' does not contain the same frames as ' + samples[0])
+    height, width = read_frame(os.path.join(src_dir, samples[0], frames[0] + '.png')).shape
+    store = FrameStore.create(path, samples, frames, height, width)
+
+    def load(i):
+        for j, frame in enumerate(frames):
+            store.array[i, j] = read_frame(os.path.join(src_dir, samples[i], frame + '.png'))
+
+    start = time.time()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(load, range(len(samples))))
+    store.flush()
+    print(len(samples) * len(frames), 'frames imported in', round(time.time() - start, 2), 's')
+    return FrameStore(path)
+
+
+if __name__ == '__main__':
+    import_png_tree('C:/Users/Administrator/Desktop/lstm_result0605/Dataset1_sample',
+                    'C:/Users/Administrator/Desktop/lstm_result0605/Dataset1_sample_store')
@@ -0,0 +1,97 @@
+# encoding:utf-8
+"""
+Lazy path slicing over a FrameStore of full-path frames
+Slice width, frame subset and padding are chosen when the view is created; the view only holds
+frame indices, so no frame is copied to disk (sample_resize_cut_dataset_ns7.ipynb wrote 11 PNGs
+per sample, four of them copies of 40.png).
+"""
+
+import numpy as np
+
+# sample lists of the ns8 / ns7 / ns16 notebooks
+NS8_FRAMES = ['9', '19', '29', '39', '49', '59', '69', '79']
+NS7_FRAMES = ['10', '15', '20', '25', '30', '35', '40']
+NS16_FRAMES = ['3', '5', '7', '10', '12', '15', '17', '20', '22', '25', '27', '30', '32', '35', '37', '40']
+
+
+def sliced_frames(width, count, last=40):
+    # count frames spaced by the slice width and ending at frame last, e.g. (5, 7) -> 10, 15, ..., 40;
+    # for the settings of the notebooks use their frame lists (NS16_FRAMES was picked by hand and
+    # does not follow any rounding of 40 - 2.5 k)
+    return [str(int(np.floor(last - k * width))) for k in reversed(range(count))]
+
+
+class SliceView(object):
+    # pad_policy 'repeat_last': pad copies of the last selected frame (41..44.png = 40.png for ns7)
+    #            'constant':    pad frames filled with pad_value
+    def __init__(self, store, frames=None, pad=0, pad_policy='repeat_last', pad_value=255):
+        if pad_policy not in ('repeat_last', 'constant'):
+            raise ValueError('unknown pad policy: ' + str(pad_policy))
+        self.store = store
+        frames = list(store.frames) if frames is None else [str(f) for f in frames]
+        selected = [store.frame_index(f) for f in frames]
+        self.n_selected = len(selected)
+        if pad_policy == 'repeat_last':
+            selected += [selected[-1]] * pad
+        else:
+            selected += [-1] * pad
+        self.index = np.array(selected, dtype=np.int64)
+        self.pad_value = pad_value
+        last = int(frames[-1])
+        self.frames = frames + [str(last + k) for k in range(1, pad + 1)]
+        self.samples = store.samples
+
+    @property
+    def array(self):
+        # the underlying full-path frames, see frame_pairs()
+        return self.store.array
+
+    @property
+    def shape(self):
+        return (len(self.samples), len(self.frames)) + self.store.shape[2:]
+
+    def __len__(self):
+        return len(self.samples)
+
+    def select(self, per_frame):
+        # apply the slicing and padding to any per-sample array (samples, store frames, ...),
+        # e.g. latents encoded once from the full-path frames
+        out = np.take(per_frame, np.maximum(self.index, 0), axis=1)
+        if (self.index < 0).any():
+            out[:, self.index < 0] = self.pad_value
+        return out
+
+    def __getitem__(self, item):
+        # view[i] -> (frames, height, width), view[a:b] -> (samples, frames, height, width)
+        if isinstance(item, slice):
+            return self.select(self.store.array[item])
+        return self.select(self.store.array[[item]])[0]
+
+    def sample(self, sample):
+        return self[self.store.sample_index(sample)]
+
+    def frame_pairs(self, include_pad=False):
+        # (sample index, store frame index) of the frames of the view, sample-major;
+        # padded frames are left out unless include_pad is set (constant pads are never included)
+        index = self.index if include_pad else self.index[:self.n_selected]
+        index = index[index >= 0]
+        s_idx, f_idx = np.meshgrid(np.arange(len(self.samples)), index, indexing='ij')
+        return s_idx.ravel(), f_idx.ravel()
+
+
+if __name__ == '__main__':
+    import sys
+    import os
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '03_dimension_reduction'))
+    from frame_store import FrameStore
+    from sequence_builder import encode_samples, build_windows, z_mean_encoder
+    from vae import load_encoder
+
+    store = FrameStore('C:/Users/dell/Desktop/Dataset_cut_resize_store')
+    encoder = load_encoder('C:/Users/Administrator/Desktop/encoder_300_128.h5')
+    latents = encode_samples(store.array, z_mean_encoder(encoder))
+    # sweep ns5 / ns7 / ns16 without re-encoding or writing frames
+    for name, frames in (('ns5', sliced_frames(8, 5)), ('ns7', NS7_FRAMES), ('ns16', NS16_FRAMES)):
+        view = SliceView(store, frames, pad=4)
+        train_X_np, train_Y_np = build_windows(view.select(latents), n_in=2, n_out=6)
+        print(name, train_X_np.shape, train_Y_np.shape)
@@ -0,0 +1,138 @@
+# encoding:utf-8
+"""
+Fused pre-processing pipeline: raw ABAQUS export -> training-ready frames
+Each source image is decoded once, the configured stages (crop, window, threshold, resize)
+are applied in memory and only the final frame is encoded and written.
+"""
+
+import os
+import sys
+import time
+from functools import partial
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '01_data_generation'))
+from cutOriginalFigure import crop_image
+
+# cutOriginalFigure.py -> binaryProcessing.py -> cut_dataset.ipynb -> resize_cut_dataset.ipynb
+DEFAULT_STAGES = [
+    ('crop', 254),
+    ('window', (492, 1292, 103, 780)),
+    ('gray', None),
+    ('threshold', 100),
+    ('window', (200, 650, None, None)),
+    ('resize', (136, 92)),
+]
+# sample_resize_cut_dataset_ns7.ipynb
+NS7_FRAMES = ['10', '15', '20', '25', '30', '35', '40']
+NS7_PAD = 4
+
+
+def apply_stage(img, name, arg):
+    if name == 'crop':
+        return crop_image(img, arg)
+    if name == 'window':
+        r0, r1, c0, c1 = arg
+        return img[r0:r1, c0:c1]
+    if name == 'gray':
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    if name == 'threshold':
+        return cv2.threshold(img, arg, 255, cv2.THRESH_BINARY)[1]
+    if name == 'resize':
+        return cv2.resize(img, tuple(arg), interpolation=cv2.INTER_AREA)
+    raise ValueError('unknown stage: ' + str(name))
+
+
+def apply_stages(img, stages, debug_paths=None):
+    # debug_paths: optional list of output paths (one per stage) for the intermediate images
+    for k, (name, arg) in enumerate(stages):
+        img = apply_stage(img, name, arg)
+        if debug_paths is not None:
+            os.makedirs(os.path.dirname(debug_paths[k]), exist_ok=True)
+            cv2.imwrite(debug_paths[k], img)
+    return np.ascontiguousarray(img)
+
+
+def frame_key(name):
+    return int(os.path.splitext(name)[0])
+
+
+def sample_key(name):
+    # 'Sample12' -> 12, other names keep their listdir order
+    digits = ''.join(c for c in name if c.isdigit())
+    return int(digits) if digits else 0
+
+
+def collect_tasks(src_dir, dst_dir, frames=None, pad=0):
+    # flat layout:   src_dir/SampleN.png          -> dst_dir/SampleN.png
+    # sample layout: src_dir/SampleN/<frame>.png  -> dst_dir/SampleN/<frame>.png
+    # frames selects a frame subset, pad appends copies of the last selected frame
+    # (40.png -> 41..44.png for ns7) which are written from the same encoded buffer
+    tasks = []
+    for name in sorted(os.listdir(src_dir), key=sample_key):
+        src_path = os.path.join(src_dir, name)
+        if not os.path.isdir(src_path):
+            tasks.append((src_path, [os.path.join(dst_dir, name)]))
+            continue
+        file_list = sorted(os.listdir(src_path), key=frame_key)
+        if frames is not None:
+            file_list = [f for f in file_list if os.path.splitext(f)[0] in frames]
+        for f in file_list:
+            tasks.append((os.path.join(src_path, f), [os.path.join(dst_dir, name, f)]))
+        if pad and file_list:
+            last = file_list[-1]
+            stem, ext = os.path.splitext(last)
+            tasks[-1][1].extend(os.path.join(dst_dir, name, str(int(stem) + k) + ext) for k in range(1, pad + 1))
+    return tasks
+
+
+def write_atomic(path, data):
+    # write to a temporary file first so that an interrupted run never leaves a truncated frame behind
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def process_task(task, stages, src_dir, debug_directory=None):
+    src_path, dst_paths = task
+    if all(os.path.exists(p) for p in dst_paths):
+        return 0
+    img = cv2.imread(src_path)
+    debug_paths = None
+    if debug_directory is not None:
+        rel_path = os.path.relpath(src_path, src_dir)
+        debug_paths = [os.path.join(debug_directory, str(k) + '_' + name, rel_path) for k, (name, _) in enumerate(stages)]
+    img = apply_stages(img, stages, debug_paths)
+    data = cv2.imencode('.png', img)[1].tobytes()
+    for dst_path in dst_paths:
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        write_atomic(dst_path, data)
+    return 1
+
+
+def run_pipeline(src_dir, dst_dir, stages=None, frames=None, pad=0, workers=None, debug_directory=None, chunksize=8):
+    # outputs which already exist are skipped, so an interrupted run is resumed by calling it again
+    stages = DEFAULT_STAGES if stages is None else stages
+    tasks = collect_tasks(src_dir, dst_dir, frames, pad)
+    func = partial(process_task, stages=stages, src_dir=src_dir, debug_directory=debug_directory)
+    start = time.time()
+    done = 0
+    with Pool(workers) as pool:
+        for n in pool.imap_unordered(func, tasks, chunksize=chunksize):
+            done += n
+    elapsed = time.time() - start
+    print(done, 'of', len(tasks), 'images processed in', round(elapsed, 2), 's,',
+          round(done / max(elapsed, 1e-9), 2), 'images/s')
+    return done
+
+
+if __name__ == '__main__':
+    # raw export -> binarized frame (replaces cutOriginalFigure.py + binaryProcessing.py)
+    run_pipeline(r"D:\Dataset\picture1", r"D:\Dataset\binary_picture1", stages=DEFAULT_STAGES[:4])
+    # sliced frames -> training-ready ns7 frames (replaces cut, resize and sample notebooks)
+    run_pipeline('D:/newdesktop/Desktop/lstm_work/lstm_data/split_cut', 'C:/Users/dell/Desktop/Dataset_sample_repeat7',
+                 stages=DEFAULT_STAGES[4:], frames=NS7_FRAMES, pad=NS7_PAD)
@@ -0,0 +1,197 @@
+# encoding:utf-8
+"""
+Direct crack-path rasterizer
+Renders the crack path of result.txt (Tip_x/Tip_y per increment) straight into the 136x92 frame
+geometry with anti-aliased polylines, one frame per prefix of the path, instead of exporting a
+4096x1870 ODB screenshot and running it through crop/binarize/cut/resize.
+"""
+
+import os
+import shutil
+import sys
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '01_data_generation'))
+
+from pipeline import sample_key
+from frame_store import FrameStore, read_frame
+from life import load_coordinates, x_tip_def
+
+SHIFT = 4  # sub-pixel bits of cv2.polylines
+
+
+class FrameGeometry(object):
+    # affine map from plate coordinates [mm] to frame pixels: col = (x - x0) * sx, row = (y_top - y) * sy
+    # the default shows the full plate width (0..10 mm) over 136 columns, centred on the initial crack y = 10
+    def __init__(self, x0=0.0, y_top=10.0 + 46 / 13.6, sx=13.6, sy=13.6, width=136, height=92):
+        self.x0 = x0
+        self.y_top = y_top
+        self.sx = sx
+        self.sy = sy
+        self.width = width
+        self.height = height
+
+    def to_pixels(self, x, y):
+        return np.stack([(np.asarray(x) - self.x0) * self.sx, (self.y_top - np.asarray(y)) * self.sy], axis=-1)
+
+
+def prefix_points(x, y, x_tip=x_tip_def):
+    # path vertices merged with the crack tips on the x_tip grid (path cut at x = x_tip[j]);
+    # returns the merged points and, for every x_tip, the index of its point
+    if x_tip[0] < x.min() or x_tip[-1] > x.max():
+        # np.interp would clamp and draw a flat crack beyond the end of the path
+        raise ValueError('x_tip grid is outside of the crack path')
+    inner = x[(x > x_tip[0]) & (x < x_tip[-1])]
+    xs = np.concatenate([x_tip, inner])
+    order = np.argsort(xs, kind='mergesort')
+    xs = xs[order]
+    ys = np.interp(xs, x, y)
+    tip_index = np.empty(len(x_tip), dtype=np.int64)
+    tip_index[order[order < len(x_tip)]] = np.flatnonzero(order < len(x_tip))
+    return xs, ys, tip_index
+
+
+def rasterize_path(x, y, geometry=None, x_tip=x_tip_def, thickness=1, foreground=0, background=255,
+                   start_x=0.0):
+    # frames (len(x_tip) - 1, height, width): frame j shows the path from the plate edge up to x_tip[j + 1]
+    geometry = geometry or FrameGeometry()
+    order = np.argsort(x, kind='mergesort')
+    x, y = x[order], y[order]
+    # the initial crack runs from the plate edge to the first tip
+    x = np.concatenate([[start_x], x])
+    y = np.concatenate([[y[0]], y])
+    xs, ys, tip_index = prefix_points(x, y, np.concatenate([[start_x], x_tip]))
+    pts = np.round(geometry.to_pixels(xs, ys) * (1 << SHIFT)).astype(np.int32)
+    canvas = np.full((geometry.height, geometry.width), background, dtype=np.uint8)
+    frames = np.empty((len(x_tip) - 1, geometry.height, geometry.width), dtype=np.uint8)
+    # draw only the new segments of every prefix on a running canvas
+    cv2.polylines(canvas, [pts[tip_index[0]:tip_index[1] + 1]], False, foreground, thickness, cv2.LINE_AA, SHIFT)
+    for j in range(1, len(x_tip)):
+        cv2.polylines(canvas, [pts[tip_index[j]:tip_index[j + 1] + 1]], False, foreground, thickness,
+                      cv2.LINE_AA, SHIFT)
+        frames[j - 1] = canvas
+    return frames
+
+
+def result_path(base_directory, sample):
+    # xfemV1-1/sampleN/result.txt or coordinate/<file>
+    path = os.path.join(base_directory, sample)
+    return os.path.join(path, 'result.txt') if os.path.isdir(path) else path
+
+
+def list_samples(base_directory):
+    # sampleN directories with a result.txt (bug.txt and other files of the job farm are ignored)
+    return sorted((s for s in os.listdir(base_directory)
+                   if s.lower().startswith('sample') and os.path.isfile(os.path.join(base_directory, s, 'result.txt'))),
+                  key=sample_key)
+
+
+def _rasterize_sample(args):
+    path, geometry, x_tip, thickness = args
+    try:
+        x, y, _ = load_coordinates(path)
+        return rasterize_path(x, y, geometry, x_tip, thickness)
+    except (ValueError, IndexError) as e:
+        # e.g. failed samples whose path stops before x_tip[-1]
+        print(path, 'skipped:', e)
+        return None
+
+
+def rasterize_directory(base_directory, store_path, geometry=None, x_tip=x_tip_def, thickness=1, workers=None):
+    # every sample of base_directory -> FrameStore with frames '1'..'40', samples in parallel;
+    # samples which cannot be rasterized are left out of the store
+    geometry = geometry or FrameGeometry()
+    samples = list_samples(base_directory)
+    frame_names = [str(j) for j in range(1, len(x_tip))]
+    store = FrameStore.create(store_path, samples, frame_names, geometry.height, geometry.width)
+    tasks = [(result_path(base_directory, s), geometry, x_tip, thickness) for s in samples]
+    start = time.time()
+    done = []
+    with Pool(workers) as pool:
+        for i, frames in enumerate(pool.imap(_rasterize_sample, tasks, chunksize=16)):
+            if frames is not None:
+                store.array[len(done)] = frames
+                done.append(samples[i])
+    store.flush()
+    if len(done) < len(samples):
+        # rewrite the store without the rows of the skipped samples
+        tmp_path = store_path.rstrip('/\\') + '.tmp'
+        compact = FrameStore.create(tmp_path, done, frame_names, geometry.height, geometry.width)
+        compact.array[:] = store.array[:len(done)]
+        compact.flush()
+        del store, compact
+        shutil.rmtree(store_path)
+        os.replace(tmp_path, store_path)
+    print(len(done), 'of', len(samples), 'samples rasterized in', round(time.time() - start, 2), 's')
+    return FrameStore(store_path)
+
+
+def calibrate_geometry(base_directory, reference_dir, samples, frames=('10', '20', '30', '40'), threshold=128):
+    # fit FrameGeometry to screenshot-derived frames: the last crack column of frame j against
+    # x_tip[j] gives the x map, the mean crack row per column against the path y gives the y map
+    cols, xs, masks = [], [], []
+    for sample in samples:
+        x, y, _ = load_coordinates(result_path(base_directory, sample))
+        order = np.argsort(x, kind='mergesort')
+        for frame in frames:
+            mask = read_frame(os.path.join(reference_dir, sample, frame + '.png')) < threshold
+            crack_cols = np.flatnonzero(mask.any(axis=0))
+            if crack_cols.size:
+                # pixel centres are the integer indices (cv2 / to_pixels convention), in x and in y
+                cols.append(crack_cols[-1])
+                xs.append(x_tip_def[int(frame)])
+                masks.append((x[order], y[order], mask, crack_cols))
+    sx, c0 = np.polyfit(xs, cols, 1)
+    x0 = -c0 / sx
+    rows, ys = [], []
+    for x, y, mask, crack_cols in masks:
+        ys.extend(np.interp(x0 + crack_cols / sx, x, y))
+        rows.extend(np.flatnonzero(mask[:, c]).mean() for c in crack_cols)
+    b, a = np.polyfit(ys, rows, 1)
+    sy = -b
+    height, width = masks[0][2].shape
+    return FrameGeometry(x0, a / sy, sx, sy, width, height)
+
+
+def validate(store, reference_dir, threshold=128, output=None):
+    # compare rasterized frames with the screenshot-derived frames reference_dir/SampleN/<frame>.png:
+    # mean absolute pixel difference and IoU of the crack masks (pixels below threshold)
+    table = []
+    for i, sample in enumerate(store.samples):
+        sample_dir = os.path.join(reference_dir, sample)
+        if not os.path.isdir(sample_dir):
+            continue
+        for j, frame in enumerate(store.frames):
+            path = os.path.join(sample_dir, frame + '.png')
+            if not os.path.exists(path):
+                continue
+            reference = read_frame(path)
+            raster = store.array[i, j]
+            mae = float(np.mean(np.abs(raster.astype(np.int16) - reference)))
+            a, b = raster < threshold, reference < threshold
+            union = np.logical_or(a, b).sum()
+            iou = float(np.logical_and(a, b).sum() / union) if union else 1.0
+            table.append((sample, frame, mae, iou))
+    if table:
+        print(len(table), 'frames compared, mean MAE', round(np.mean([t[2] for t in table]), 3),
+              'mean IoU', round(np.mean([t[3] for t in table]), 3))
+    if output is not None:
+        with open(output, 'w') as f:
+            f.write('sample\tframe\tmae\tiou\n')
+            f.writelines('%s\t%s\t%.6f\t%.6f\n' % t for t in table)
+    return table
+
+
+if __name__ == '__main__':
+    base_directory = 'D:/Dataset/xfemV1-1'
+    reference_dir = 'D:/newdesktop/Desktop/lstm_work/lstm_data/split_cut_resize'
+    # fit the frame geometry on a few samples that also have screenshot-derived frames
+    reference = [s for s in list_samples(base_directory) if os.path.isdir(os.path.join(reference_dir, s))]
+    geometry = calibrate_geometry(base_directory, reference_dir, reference[:20])
+    print('geometry', vars(geometry))
+    store = rasterize_directory(base_directory, 'D:/Dataset/raster_store', geometry)
+    validate(store, reference_dir, output='D:/Dataset/raster_validation.txt')
@@ -0,0 +1,147 @@
+"""
+Content-addressed cache of encoder outputs
+Entries are keyed by the sha1 of the uint8 frame and grouped by a fingerprint of the encoder weights:
+<path>/<fingerprint>/keys.npy        (N, 20) uint8 frame hashes
+<path>/<fingerprint>/z_mean.npy      (N, latent_dim) float32
+<path>/<fingerprint>/z_log_var.npy   (N, latent_dim) float32, only with store_log_var=True
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+
+def encoder_fingerprint(encoder):
+    h = hashlib.sha1()
+    for w in encoder.get_weights():
+        w = np.ascontiguousarray(w)
+        h.update(str(w.shape).encode())
+        h.update(w.tobytes())
+    return h.hexdigest()[:16]
+
+
+def frame_keys(frames):
+    frames = np.ascontiguousarray(frames, dtype=np.uint8)
+    keys = np.empty((len(frames), 20), dtype=np.uint8)
+    for i in range(len(frames)):
+        keys[i] = np.frombuffer(hashlib.sha1(frames[i].tobytes()).digest(), dtype=np.uint8)
+    return keys
+
+
+def save_atomic(path, array):
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+class EmbeddingCache(object):
+    def __init__(self, path, encoder, store_log_var=False, batch_size=1024):
+        self.encoder = encoder
+        self.store_log_var = store_log_var
+        self.batch_size = batch_size
+        self.fingerprint = encoder_fingerprint(encoder)
+        self.directory = os.path.join(path, self.fingerprint)
+        self.hits = 0
+        self.misses = 0
+        self._new = []
+        keys_path = os.path.join(self.directory, 'keys.npy')
+        if os.path.exists(keys_path):
+            self.keys = np.load(keys_path)
+            self.z_mean = np.load(os.path.join(self.directory, 'z_mean.npy'))
+            log_var_path = os.path.join(self.directory, 'z_log_var.npy')
+            if store_log_var and not os.path.exists(log_var_path):
+                raise ValueError('cache at ' + self.directory + ' was built without z_log_var')
+            # a cache with z_log_var keeps it for every entry, whatever store_log_var is
+            self.z_log_var = np.load(log_var_path) if os.path.exists(log_var_path) else None
+            lengths = [len(self.z_mean)] + ([] if self.z_log_var is None else [len(self.z_log_var)])
+            if any(n != len(self.keys) for n in lengths):
+                raise ValueError('cache at ' + self.directory + ' is inconsistent with keys.npy')
+        else:
+            self.keys = np.empty((0, 20), dtype=np.uint8)
+            self.z_mean = None
+            self.z_log_var = None
+        self.index = {k.tobytes(): i for i, k in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.index)
+
+    def _predict(self, frames):
+        x = np.expand_dims(frames, -1).astype("float32") / 255
+        outputs = self.encoder.predict(x, batch_size=self.batch_size, verbose=0)
+        if isinstance(outputs, (list, tuple)):
+            return outputs[0], (outputs[1] if len(outputs) > 1 else None)
+        return outputs, None
+
+    def encode(self, frames):
+        # frames: uint8 (N, 92, 136) or (N, 92, 136, 1); only frames which are not cached yet are encoded
+        frames = np.asarray(frames, dtype=np.uint8)
+        if frames.ndim == 4:
+            frames = frames[..., 0]
+        keys = frame_keys(frames)
+        rows = np.empty(len(frames), dtype=np.int64)
+        missing = {}
+        for i, k in enumerate(keys):
+            kb = k.tobytes()
+            if kb in self.index:
+                rows[i] = self.index[kb]
+            else:
+                missing.setdefault(kb, []).append(i)
+        self.hits += len(frames) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            first = np.array([v[0] for v in missing.values()])
+            z_mean, z_log_var = self._predict(frames[first])
+            keep_log_var = self.store_log_var or self.z_log_var is not None
+            if keep_log_var and z_log_var is None:
+                raise ValueError('encoder does not output z_log_var')
+            start = len(self.index)
+            self._append(keys[first], z_mean, z_log_var if keep_log_var else None)
+            for n, (kb, positions) in enumerate(missing.items()):
+                self.index[kb] = start + n
+                rows[positions] = start + n
+        z_mean = self.z_mean[rows]
+        if self.store_log_var:
+            return z_mean, self.z_log_var[rows]
+        return z_mean
+
+    def _append(self, keys, z_mean, z_log_var):
+        z_mean = np.asarray(z_mean, dtype=np.float32)
+        self.keys = np.concatenate([self.keys, keys])
+        self.z_mean = z_mean if self.z_mean is None else np.concatenate([self.z_mean, z_mean])
+        if z_log_var is not None:
+            z_log_var = np.asarray(z_log_var, dtype=np.float32)
+            self.z_log_var = z_log_var if self.z_log_var is None else np.concatenate([self.z_log_var, z_log_var])
+        self._new.append(len(keys))
+
+    def save(self):
+        if not self._new:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        save_atomic(os.path.join(self.directory, 'z_mean.npy'), self.z_mean)
+        if self.z_log_var is not None:
+            save_atomic(os.path.join(self.directory, 'z_log_var.npy'), self.z_log_var)
+        # keys last: a cache is only valid once its keys are written
+        save_atomic(os.path.join(self.directory, 'keys.npy'), self.keys)
+        self._new = []
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.index),
+                'hit_rate': self.hits / total if total else 0.0}
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '02_pre_processing'))
+    from frame_store import FrameStore
+    from vae import load_encoder
+
+    encoder = load_encoder('C:/Users/Administrator/Desktop/encoder_1000_128_modi.h5')
+    cache = EmbeddingCache('C:/Users/Administrator/Desktop/embedding_cache', encoder)
+    store = FrameStore('C:/Users/Administrator/Desktop/Dataset1_train_life_store')
+    frames = store.array[:, 2:].reshape((-1,) + store.shape[2:])
+    frames = np.where(frames > 200, 255, 0).astype(np.uint8)  # cv2.threshold(pic, 200, 255, cv2.THRESH_BINARY)
+    z_mean_train = cache.encode(frames)
+    cache.save()
+    print(cache.stats())
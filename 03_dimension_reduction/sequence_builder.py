@@ -0,0 +1,70 @@
+"""
+Sliding-window sequence builder for the LSTM path predictor
+Every frame is encoded exactly once, the input/output windows are strided views over the
+per-sample latent array (samples, frames, latent_dim).
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def z_mean_encoder(encoder, batch_size=1024):
+    # wrap a VAE encoder as encode(frames) -> z_mean, frames are uint8 (N, 92, 136)
+    def encode(frames):
+        x = np.expand_dims(frames, -1).astype("float32") / 255
+        outputs = encoder.predict(x, batch_size=batch_size, verbose=0)
+        return outputs[0] if isinstance(outputs, (list, tuple)) else outputs
+    return encode
+
+
+def encode_samples(frames, encode, chunk=256):
+    # frames: (samples, frames, 92, 136) uint8, e.g. FrameStore.array
+    # encode: callable uint8 frames -> latent vectors (z_mean_encoder(encoder) or EmbeddingCache.encode)
+    n_sample, n_frame = frames.shape[:2]
+    latents = None
+    for start in range(0, n_sample, chunk):
+        block = np.asarray(frames[start:start + chunk])
+        z = encode(block.reshape((-1,) + block.shape[2:]))
+        if isinstance(z, (list, tuple)):
+            z = z[0]  # (z_mean, z_log_var) of EmbeddingCache.encode with store_log_var=True
+        z = np.asarray(z)
+        if latents is None:
+            latents = np.empty((n_sample, n_frame, z.shape[-1]), dtype=z.dtype)
+        latents[start:start + len(block)] = z.reshape(len(block), n_frame, -1)
+    return latents
+
+
+def window_views(latents, n_in=2, n_out=6, stride=1):
+    # (samples, frames, dim) -> strided views (samples, windows, n_in, dim) and (samples, windows, n_out, dim)
+    width = n_in + n_out
+    if latents.shape[1] < width:
+        raise ValueError('%d frames per sample are fewer than the window length %d' % (latents.shape[1], width))
+    views = np.moveaxis(sliding_window_view(latents, width, axis=1)[:, ::stride], -1, 2)
+    return views[:, :, :n_in], views[:, :, n_in:]
+
+
+def build_windows(latents, n_in=2, n_out=6, stride=1, max_windows=None):
+    # window i of a sample: frames i..i+n_in-1 as input, the next n_out frames as output;
+    # rows are ordered sample by sample like the notebook loop
+    x_view, y_view = window_views(latents, n_in, n_out, stride)
+    if max_windows is not None:
+        x_view, y_view = x_view[:, :max_windows], y_view[:, :max_windows]
+    dim = latents.shape[-1]
+    train_X_np = x_view.reshape(-1, n_in, dim)
+    train_Y_np = y_view.reshape(-1, n_out, dim)
+    return train_X_np, train_Y_np
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '02_pre_processing'))
+    from frame_store import FrameStore
+    from vae import load_encoder
+
+    encoder = load_encoder('C:/Users/Administrator/Desktop/encoder_300_128.h5')
+    store = FrameStore('C:/Users/Administrator/Desktop/Dataset_noslice_train_vae_store')
+    latents = encode_samples(store.array, z_mean_encoder(encoder))
+    train_X_np, train_Y_np = build_windows(latents, n_in=2, n_out=6)
+    np.save('C:/Users/Administrator/Desktop/train_X_np_noslice.npy', train_X_np)
+    np.save('C:/Users/Administrator/Desktop/train_Y_np_noslice.npy', train_Y_np)
@@ -0,0 +1,182 @@
+"""
+VAE used for the dimension reduction of crack frames (same model as vae_module_pred_crack.ipynb)
+with a streaming tf.data input mode so that the training set does not have to fit in memory.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '02_pre_processing'))
+
+latent_dim = 100
+
+
+class Sampling(layers.Layer):
+    """Uses (z_mean, z_log_var) to sample z, the vector encoding a path of crack."""
+
+    def call(self, inputs):
+        z_mean, z_log_var = inputs
+        batch = tf.shape(z_mean)[0]
+        dim = tf.shape(z_mean)[1]
+        epsilon = tf.keras.backend.random_normal(shape=(batch, dim))
+        return z_mean + tf.exp(0.5 * z_log_var) * epsilon
+
+
+def build_encoder(latent_dim=latent_dim, input_shape=(92, 136, 1)):
+    encoder_inputs = keras.Input(shape=input_shape)
+    x = layers.Conv2D(32, 3, activation="relu", strides=2, padding="same")(encoder_inputs)
+    x = layers.Conv2D(64, 3, activation="relu", strides=2, padding="same")(x)
+    x = layers.Flatten()(x)
+    x = layers.Dense(200, activation="relu")(x)
+    z_mean = layers.Dense(latent_dim, name="z_mean")(x)
+    z_log_var = layers.Dense(latent_dim, name="z_log_var")(x)
+    z = Sampling()([z_mean, z_log_var])
+    return keras.Model(encoder_inputs, [z_mean, z_log_var, z], name="encoder")
+
+
+def build_decoder(latent_dim=latent_dim):
+    latent_inputs = keras.Input(shape=(latent_dim,))
+    x = layers.Dense(23 * 34 * 64, activation="relu")(latent_inputs)
+    x = layers.Reshape((23, 34, 64))(x)
+    x = layers.Conv2DTranspose(64, 3, activation="relu", strides=2, padding="same")(x)
+    x = layers.Conv2DTranspose(32, 3, activation="relu", strides=2, padding="same")(x)
+    decoder_outputs = layers.Conv2DTranspose(1, 3, activation="sigmoid", padding="same")(x)
+    return keras.Model(latent_inputs, decoder_outputs, name="decoder")
+
+
+def load_encoder(path):
+    return tf.keras.models.load_model(path, custom_objects={'Sampling': Sampling})
+
+
+def normalize(frames):
+    # uint8 (batch, 92, 136) -> float32 (batch, 92, 136, 1) in [0, 1]
+    return tf.expand_dims(tf.cast(frames, tf.float32) / 255.0, -1)
+
+
+def frame_dataset(source, batch_size=128, shuffle_buffer=10000, seed=None):
+    # stream the frames of a FrameStore (or any source with .array and .frame_pairs()) from disk:
+    # indices are shuffled with a bounded buffer, batches are gathered from the memmap and
+    # normalized on parallel workers and prefetched so that I/O overlaps train_step
+    array = source.array
+    s_idx, f_idx = source.frame_pairs()
+    height, width = array.shape[-2:]
+
+    def gather(batch_index):
+        order = np.argsort(batch_index)
+        rows = np.empty((len(batch_index), height, width), dtype=np.uint8)
+        rows[order] = array[s_idx[batch_index[order]], f_idx[batch_index[order]]]
+        return rows
+
+    def load(batch_index):
+        frames = tf.numpy_function(gather, [batch_index], tf.uint8)
+        frames.set_shape([None, height, width])
+        return normalize(frames)
+
+    dataset = tf.data.Dataset.range(len(s_idx))
+    if shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=False)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def png_dataset(data_path, batch_size=128, shuffle_buffer=10000, seed=None):
+    # stream a SampleN/<frame>.png tree without packing it first
+    dataset = tf.data.Dataset.list_files(os.path.join(data_path, '*', '*.png'), shuffle=bool(shuffle_buffer), seed=seed)
+    if shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+
+    def load(path):
+        return tf.io.decode_png(tf.io.read_file(path), channels=1)
+
+    dataset = dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=False)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(lambda x: tf.cast(x, tf.float32) / 255.0, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+class ThroughputLogger(keras.callbacks.Callback):
+    # print samples/sec of every epoch
+    def __init__(self, batch_size):
+        super(ThroughputLogger, self).__init__()
+        self.batch_size = batch_size
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.time()
+        self.batches = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.batches += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.time() - self.start
+        print('epoch', epoch + 1, ':', round(self.batches * self.batch_size / max(elapsed, 1e-9), 1), 'samples/s')
+
+
+class VAE(keras.Model):
+    def __init__(self, encoder, decoder, **kwargs):
+        super(VAE, self).__init__(**kwargs)
+        self.encoder = encoder
+        self.decoder = decoder
+        self.total_loss_tracker = keras.metrics.Mean(name="total_loss")
+        self.reconstruction_loss_tracker = keras.metrics.Mean(
+            name="reconstruction_loss"
+        )
+        self.kl_loss_tracker = keras.metrics.Mean(name="kl_loss")
+
+    @property
+    def metrics(self):
+        return [
+            self.total_loss_tracker,
+            self.reconstruction_loss_tracker,
+            self.kl_loss_tracker,
+        ]
+
+    def train_step(self, data):
+        with tf.GradientTape() as tape:
+            z_mean, z_log_var, z = self.encoder(data)
+            reconstruction = self.decoder(z)
+            reconstruction_loss = tf.reduce_mean(
+                tf.reduce_sum(
+                    keras.losses.binary_crossentropy(data, reconstruction), axis=(1, 2)
+                )
+            )
+            kl_loss = -0.5 * (1 + z_log_var - tf.square(z_mean) - tf.exp(z_log_var))
+            kl_loss = tf.reduce_mean(tf.reduce_sum(kl_loss, axis=1))
+            total_loss = reconstruction_loss + kl_loss
+        grads = tape.gradient(total_loss, self.trainable_weights)
+        self.optimizer.apply_gradients(zip(grads, self.trainable_weights))
+        self.total_loss_tracker.update_state(total_loss)
+        self.reconstruction_loss_tracker.update_state(reconstruction_loss)
+        self.kl_loss_tracker.update_state(kl_loss)
+        return {
+            "loss": self.total_loss_tracker.result(),
+            "reconstruction_loss": self.reconstruction_loss_tracker.result(),
+            "kl_loss": self.kl_loss_tracker.result(),
+        }
+
+    def fit_stream(self, source, epochs=300, batch_size=128, shuffle_buffer=10000, callbacks=None, **kwargs):
+        # streaming counterpart of vae.fit(X_train_final, ...): source is a FrameStore or a PNG tree path
+        if isinstance(source, str):
+            dataset = png_dataset(source, batch_size, shuffle_buffer)
+        else:
+            dataset = frame_dataset(source, batch_size, shuffle_buffer)
+        callbacks = list(callbacks or []) + [ThroughputLogger(batch_size)]
+        return self.fit(dataset, epochs=epochs, callbacks=callbacks, **kwargs)
+
+
+if __name__ == '__main__':
+    from frame_store import FrameStore
+
+    store = FrameStore('C:/Users/Administrator/Desktop/lstm_result0605/Dataset1_sample_store')
+    vae = VAE(build_encoder(), build_decoder())
+    vae.compile(optimizer=keras.optimizers.Adam())
+    vae.fit_stream(store, epochs=300, batch_size=128)
+    vae.encoder.save('C:/Users/Administrator/Desktop/encoder_300_128.h5')
+    vae.decoder.save('C:/Users/Administrator/Desktop/decoder_300_128.h5')
@@ -0,0 +1,107 @@
+"""
+Batched path-accuracy metrics (lstm_vae_metrics-ns7.ipynb)
+Predictions and ground truth are loaded once as stacked arrays; SSIM and the column-wise crack
+displacement RMS are computed for all samples/windows at once, chunks of samples in parallel.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from scipy.ndimage import uniform_filter
+
+
+def read_gray(path):
+    img = cv2.imread(path)
+    if img is None:
+        raise IOError('cannot read ' + path)
+    return cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+
+
+def load_stack(paths, workers=8):
+    with ThreadPoolExecutor(workers) as pool:
+        return np.stack(list(pool.map(read_gray, paths)))
+
+
+def ssim_batch(pred, truth, data_range=255.0, win_size=7):
+    # structural_similarity of skimage (default arguments) for stacks of images (n, height, width)
+    x = pred.astype(np.float64)
+    y = truth.astype(np.float64)
+    size = (1, win_size, win_size)
+    cov_norm = win_size ** 2 / (win_size ** 2 - 1.0)
+    ux = uniform_filter(x, size=size)
+    uy = uniform_filter(y, size=size)
+    uxx = uniform_filter(x * x, size=size)
+    uyy = uniform_filter(y * y, size=size)
+    uxy = uniform_filter(x * y, size=size)
+    vx = cov_norm * (uxx - ux * ux)
+    vy = cov_norm * (uyy - uy * uy)
+    vxy = cov_norm * (uxy - ux * uy)
+    C1 = (0.01 * data_range) ** 2
+    C2 = (0.03 * data_range) ** 2
+    S = ((2 * ux * uy + C1) * (2 * vxy + C2)) / ((ux ** 2 + uy ** 2 + C1) * (vx + vy + C2))
+    pad = (win_size - 1) // 2
+    return S[:, pad:-pad, pad:-pad].mean(axis=(1, 2))
+
+
+def displacement_rms_batch(pred, truth, min_pixels=3):
+    # per column, the distance between the 1st and the 4th differing pixel is the crack displacement;
+    # columns with fewer than 4 differing pixels count as 0, RMS over all columns
+    diff = pred != truth
+    count = np.cumsum(diff, axis=1)
+    total = count[:, -1, :]
+    first = np.argmax(count >= 1, axis=1)
+    fourth = np.argmax(count >= min_pixels + 1, axis=1)
+    u = np.where(total > min_pixels, fourth - first, 0).astype(np.float64)
+    return np.sqrt(np.mean(u * u, axis=1))
+
+
+def sample_paths(pred_path, truth_path, samples, windows, timestep, truth_frame):
+    pred = [os.path.join(pred_path, s, str(j), timestep + '.png') for s in samples for j in range(windows)]
+    truth = [os.path.join(truth_path, s, truth_frame + '.png') for s in samples]
+    return pred, truth
+
+
+def evaluate_chunk(args):
+    pred_path, truth_path, samples, windows, timestep, truth_frame, cut_number = args
+    pred_files, truth_files = sample_paths(pred_path, truth_path, samples, windows, timestep, truth_frame)
+    pred = load_stack(pred_files)[:, :, cut_number:]
+    # the ground truth of a sample is read once and shared by its windows
+    truth = np.repeat(load_stack(truth_files)[:, :, cut_number:], windows, axis=0)
+    ssim = ssim_batch(pred, truth).reshape(len(samples), windows)
+    rms = displacement_rms_batch(pred, truth).reshape(len(samples), windows)
+    return ssim, rms
+
+
+def evaluate(pred_path, truth_path, samples=None, windows=5, timestep='4', truth_frame='40', cut_number=119,
+             workers=None, chunk=16):
+    # per-sample/per-window SSIM and displacement RMS, arrays (samples, windows)
+    if samples is None:
+        samples = sorted((s for s in os.listdir(truth_path) if os.path.isdir(os.path.join(pred_path, s))),
+                         key=lambda x: int(x[6:]))
+    tasks = [(pred_path, truth_path, samples[k:k + chunk], windows, timestep, truth_frame, cut_number)
+             for k in range(0, len(samples), chunk)]
+    start = time.time()
+    with ProcessPoolExecutor(workers) as pool:
+        results = list(pool.map(evaluate_chunk, tasks))
+    ssim = np.concatenate([r[0] for r in results])
+    rms = np.concatenate([r[1] for r in results])
+    print(len(samples), 'samples evaluated in', round(time.time() - start, 2), 's')
+    return samples, ssim, rms
+
+
+def write_table(path, samples, ssim, rms):
+    with open(path, 'w') as f:
+        f.write('sample\twindow\tssim\trms\n')
+        for i, s in enumerate(samples):
+            for j in range(ssim.shape[1]):
+                f.write('%s\t%d\t%.6f\t%.6f\n' % (s, j, ssim[i, j], rms[i, j]))
+
+
+if __name__ == '__main__':
+    samples, ssim, rms = evaluate('C:/Users/dell/Desktop/pred_crack_lstm_vae_ns7/',
+                                  'C:/Users/dell/Desktop/Dataset_sample_repeat_test/')
+    np.savetxt('C:/Users/dell/Desktop/total_path_metric_ssim_ns7.txt', ssim)
+    write_table('C:/Users/dell/Desktop/total_path_metric_ns7.txt', samples, ssim, rms)
@@ -0,0 +1,82 @@
+"""
+Batched rendering of the predicted crack paths
+yhat (windows, timesteps, latent_dim) is decoded in large batches and the PNG files are written
+by a background thread pool, producing the same <sample>/<window>/<timestep>.png tree as
+lstm_module_pred_crack.ipynb.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+def output_paths(save_path, sample_names, n_window, windows_per_sample=6, n_timestep=6):
+    # file path of every (window, timestep), window k belongs to sample_names[k // windows_per_sample]
+    paths = []
+    for num_sample in range(n_window):
+        dir_path = os.path.join(save_path, sample_names[num_sample // windows_per_sample],
+                                str(num_sample % windows_per_sample))
+        paths.append([os.path.join(dir_path, str(timestep) + '.png') for timestep in range(n_timestep)])
+    return paths
+
+
+def render_predictions(yhat, decoder, save_path, sample_names, windows_per_sample=6, batch_size=1024, workers=8):
+    n_window, n_timestep, latent_dim = yhat.shape
+    paths = output_paths(save_path, sample_names, n_window, windows_per_sample, n_timestep)
+    for row in paths:
+        os.makedirs(os.path.dirname(row[0]), exist_ok=True)
+    flat_paths = [p for row in paths for p in row]
+    latents = yhat.reshape(-1, latent_dim).astype("float32")
+    start = time.time()
+    with ThreadPoolExecutor(workers) as pool:
+        pending = []
+        for begin in range(0, len(latents), batch_size):
+            x_decoded = decoder.predict(latents[begin:begin + batch_size], batch_size=batch_size, verbose=0)
+            images = x_decoded.reshape(-1, x_decoded.shape[1], x_decoded.shape[2]) * 255
+            # wait for the previous batch only now, so PNG writing overlaps the decoding of this batch
+            for f in pending:
+                f.result()
+            pending = [pool.submit(cv2.imwrite, flat_paths[begin + k], images[k]) for k in range(len(images))]
+        for f in pending:
+            f.result()
+    elapsed = time.time() - start
+    print(len(flat_paths), 'frames rendered in', round(elapsed, 2), 's')
+    return elapsed
+
+
+def render_predictions_loop(yhat, decoder, save_path, sample_names, windows_per_sample=6):
+    # reference implementation: one decoder.predict call and one synchronous imwrite per frame
+    paths = output_paths(save_path, sample_names, yhat.shape[0], windows_per_sample, yhat.shape[1])
+    start = time.time()
+    for num_sample in range(yhat.shape[0]):
+        os.makedirs(os.path.dirname(paths[num_sample][0]), exist_ok=True)
+        for timestep in range(yhat.shape[1]):
+            tmp = np.array([yhat[num_sample, timestep, :]]).astype("float32")
+            x_decoded = decoder.predict(tmp, verbose=0)
+            cv2.imwrite(paths[num_sample][timestep], x_decoded[0].reshape(x_decoded.shape[1], x_decoded.shape[2]) * 255)
+    return time.time() - start
+
+
+def benchmark_render(yhat, decoder, save_path, sample_names, windows_per_sample=6, n_window=60):
+    # time the per-frame loop and the batched renderer on the first n_window windows
+    yhat = yhat[:n_window]
+    t_loop = render_predictions_loop(yhat, decoder, os.path.join(save_path, 'loop'), sample_names, windows_per_sample)
+    t_batch = render_predictions(yhat, decoder, os.path.join(save_path, 'batch'), sample_names, windows_per_sample)
+    n_frame = yhat.shape[0] * yhat.shape[1]
+    print('loop   :', round(n_frame / t_loop, 1), 'frames/s')
+    print('batched:', round(n_frame / t_batch, 1), 'frames/s')
+    print('speedup:', round(t_loop / t_batch, 1), 'x')
+    return t_loop / t_batch
+
+
+if __name__ == '__main__':
+    import tensorflow as tf
+
+    yhat = np.load('C:/Users/Administrator/Desktop/yhat.npy')
+    decoder = tf.keras.models.load_model('C:/Users/Administrator/Desktop/lstm_work/lstm_result0605/decoder.h5')
+    c_dir_path = 'C:/Users/Administrator/Desktop/lstm_work/Dataset1_test_vae'
+    p_c_dir_list = sorted(os.listdir(c_dir_path), key=lambda x: int(x[6:]))
+    render_predictions(yhat, decoder, 'C:/Users/Administrator/Desktop/pred_crack_lstm_vae2/', p_c_dir_list)
@@ -0,0 +1,140 @@
+"""
+Latent-space re-weighting of the LSTM training windows
+The density of every window of train_X_np (windows, 2, 100) is estimated from the distance to its
+k-th nearest neighbour in a PCA projection of the flattened windows, using a cKDTree (O(N log N)
+instead of a pairwise pass). Rare windows get larger weights, sample_weight for model.fit.
+The defaults (8 components, approximate queries with eps=1) keep the index close to O(N log N)
+even for unstructured windows: an exact 16-d tree degrades to about N^1.9.
+Appended windows only need queries for the new points and a merge of the old neighbour lists.
+"""
+
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def flatten_windows(train_X_np):
+    return np.asarray(train_X_np, dtype=np.float64).reshape(len(train_X_np), -1)
+
+
+def merge_neighbours(dist_a, dist_b, k):
+    # the k smallest distances of two neighbour lists (n, ka) and (n, kb)
+    return np.sort(np.concatenate([dist_a, dist_b], axis=1), axis=1)[:, :k]
+
+
+class DensityReweighter(object):
+    # weight ~ r_k ** (n_components * alpha): alpha = 1 fully flattens the kNN density estimate,
+    # alpha = 0 gives uniform weights; weights are normalized to mean 1, then clipped (the mean of
+    # the clipped weights is only approximately 1)
+    def __init__(self, k=16, n_components=8, alpha=0.5, clip=(0.1, 10.0), eps=1.0, pca_samples=20000,
+                 seed=0, workers=-1):
+        self.k = k
+        self.n_components = n_components
+        self.alpha = alpha
+        self.clip = clip
+        self.eps = eps  # > 0: approximate queries, the k-th neighbour is within (1 + eps) of the true one
+        self.pca_samples = pca_samples
+        self.seed = seed
+        self.workers = workers
+        self.mean = None
+        self.components = None
+        self.points = None
+        self.dist = None
+        self.tree = None
+
+    def fit_pca(self, X):
+        # the projection is fitted once and kept for appended windows, so distances stay comparable
+        rng = np.random.RandomState(self.seed)
+        sub = X[rng.choice(len(X), self.pca_samples, replace=False)] if len(X) > self.pca_samples else X
+        self.mean = sub.mean(axis=0)
+        _, _, vt = np.linalg.svd(sub - self.mean, full_matrices=False)
+        self.components = vt[:self.n_components]
+
+    def project(self, X):
+        return (X - self.mean).dot(self.components.T)
+
+    def query(self, tree, points, k):
+        dist, _ = tree.query(points, k=k, eps=self.eps, workers=self.workers)
+        return dist.reshape(len(points), k)
+
+    def fit(self, train_X_np):
+        start = time.time()
+        X = flatten_windows(train_X_np)
+        self.fit_pca(X)
+        self.points = self.project(X)
+        self.tree = cKDTree(self.points)
+        # the first neighbour of every point is the point itself
+        self.dist = self.query(self.tree, self.points, self.k + 1)[:, 1:]
+        print(len(X), 'windows indexed in', round(time.time() - start, 2), 's')
+        return self
+
+    def append(self, train_X_np):
+        # old points: merge their neighbour lists with the neighbours among the new points;
+        # new points: neighbours among the old points and among the new points
+        start = time.time()
+        new_points = self.project(flatten_windows(train_X_np))
+        new_tree = cKDTree(new_points)
+        k_new = min(self.k, len(new_points))
+        self.dist = merge_neighbours(self.dist, self.query(new_tree, self.points, k_new), self.k)
+        new_dist = merge_neighbours(self.query(self.tree, new_points, self.k),
+                                    self.query(new_tree, new_points, k_new + 1)[:, 1:], self.k)
+        self.points = np.vstack([self.points, new_points])
+        self.dist = np.vstack([self.dist, new_dist])
+        self.tree = cKDTree(self.points)
+        print(len(new_points), 'windows appended in', round(time.time() - start, 2), 's')
+        return self
+
+    def weights(self):
+        r = self.dist[:, -1]
+        r = np.maximum(r, r[r > 0].min() if (r > 0).any() else 1.0)  # duplicate windows
+        log_w = self.n_components * self.alpha * np.log(r)
+        w = np.exp(log_w - log_w.max())
+        w /= w.mean()
+        if self.clip is not None:
+            w = np.clip(w, self.clip[0], self.clip[1])
+        return w.astype(np.float32)
+
+    def save(self, path):
+        np.savez(path, mean=self.mean, components=self.components, points=self.points, dist=self.dist,
+                 params=np.array([self.k, self.n_components, self.alpha, self.eps]))
+
+    @classmethod
+    def load(cls, path, clip=(0.1, 10.0)):
+        data = np.load(path)
+        k, n_components, alpha, eps = data['params']
+        reweighter = cls(int(k), int(n_components), float(alpha), clip, float(eps))
+        reweighter.mean = data['mean']
+        reweighter.components = data['components']
+        reweighter.points = data['points']
+        reweighter.dist = data['dist']
+        reweighter.tree = cKDTree(reweighter.points)
+        return reweighter
+
+
+def sample_weights(train_X_np, k=16, n_components=8, alpha=0.5, clip=(0.1, 10.0), eps=1.0):
+    return DensityReweighter(k, n_components, alpha, clip, eps).fit(train_X_np).weights()
+
+
+def benchmark_reweight(train_X_np, sizes=(25000, 50000, 100000, 200000), eps=(0.0, 1.0), n_components=8):
+    # fit time over growing subsets of train_X_np, exact against approximate queries, and the
+    # relative error of the approximate k-th neighbour distances
+    for n in sizes:
+        if n > len(train_X_np):
+            break
+        exact = None
+        for e in eps:
+            start = time.time()
+            reweighter = DensityReweighter(n_components=n_components, eps=e).fit(train_X_np[:n])
+            elapsed = time.time() - start
+            if exact is None:
+                exact = reweighter.dist[:, -1]
+            err = np.mean(reweighter.dist[:, -1] / np.maximum(exact, 1e-12) - 1)
+            print(n, 'windows, eps', e, ':', round(elapsed, 2), 's, mean r_k error', round(float(err), 4))
+
+
+if __name__ == '__main__':
+    train_X_np = np.load('C:/Users/Administrator/Desktop/lstm_work/lstm_result0605/train_X_np.npy')
+    reweighter = DensityReweighter().fit(train_X_np)
+    reweighter.save('C:/Users/Administrator/Desktop/lstm_work/lstm_result0605/density_index.npz')
+    np.savetxt('C:/Users/Administrator/Desktop/sample_weights.txt', reweighter.weights())
@@ -0,0 +1,128 @@
+"""
+Life MLP of life_train_and_pred.ipynb with a saved, invertible label normalizer
+and batched inference over whole predicted latent sequences.
+"""
+
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+
+class LifeNormalizer(object):
+    # life -> min(life, clip) -> log (0 stays 0) -> / scale, scale is the max log-life of the training labels
+    def __init__(self, clip=2000.0, scale=None):
+        self.clip = float(clip)
+        self.scale = scale
+
+    def _log(self, life):
+        life = np.minimum(np.asarray(life, dtype=np.float64), self.clip)
+        out = np.zeros_like(life)
+        np.log(life, out=out, where=life != 0)
+        return out
+
+    def fit(self, life):
+        self.scale = float(np.max(self._log(life)))
+        return self
+
+    def transform(self, life):
+        return self._log(life) / self.scale
+
+    def inverse_transform(self, label):
+        return np.exp(np.asarray(label, dtype=np.float64) * self.scale)
+
+    def to_dict(self):
+        return {'clip': self.clip, 'scale': self.scale}
+
+    @classmethod
+    def from_dict(cls, params):
+        return cls(params['clip'], params['scale'])
+
+
+def build_life_model(latent_dim=100):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense
+
+    model = Sequential()
+    model.add(Dense(1000, activation='relu', input_shape=(latent_dim,)))
+    model.add(Dense(500, activation='relu'))
+    model.add(Dense(100, activation='relu'))
+    model.add(Dense(10, activation='relu'))
+    model.add(Dense(1, activation='sigmoid'))
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+
+def save_life_model(model, normalizer, path):
+    # the normalizer is written into the attributes of the .h5 file (a .json sidecar for other formats)
+    model.save(path)
+    params = json.dumps(normalizer.to_dict())
+    if path.endswith('.h5'):
+        import h5py
+        with h5py.File(path, 'a') as f:
+            f.attrs['life_normalizer'] = params
+    else:
+        with open(path + '.normalizer.json', 'w', encoding='utf-8') as f:
+            f.write(params)
+
+
+def load_life_model(path):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(path, compile=False)
+    params = None
+    if path.endswith('.h5'):
+        import h5py
+        with h5py.File(path, 'r') as f:
+            params = f.attrs.get('life_normalizer')
+    elif os.path.exists(path + '.normalizer.json'):
+        with open(path + '.normalizer.json', encoding='utf-8') as f:
+            params = f.read()
+    if params is None:
+        # models saved before the normalizer was stored: labels were clipped at 2000 and the
+        # training max was log(2000) = 7.600902459542082
+        return model, LifeNormalizer(2000.0, math.log(2000.0))
+    return model, LifeNormalizer.from_dict(json.loads(params))
+
+
+def predict_life(model, normalizer, latents, batch_size=4096):
+    # latents: (samples, timesteps, latent_dim), e.g. yhat -> lives (samples, timesteps) in one batched call
+    latents = np.asarray(latents, dtype=np.float32)
+    flat = latents.reshape(-1, latents.shape[-1])
+    label = model.predict(flat, batch_size=batch_size, verbose=0)
+    return normalizer.inverse_transform(label.reshape(latents.shape[:-1]))
+
+
+def benchmark_life(model, latent_dim=100, batch_sizes=(1, 128, 4096, 65536), repeats=5):
+    # latency of one call and throughput for different batch sizes
+    results = []
+    for batch_size in batch_sizes:
+        x = np.random.normal(size=(batch_size, latent_dim)).astype("float32")
+        model.predict_on_batch(x)  # warm up
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.predict_on_batch(x)
+            times.append(time.perf_counter() - start)
+        latency = float(np.median(times))
+        results.append({'batch_size': batch_size, 'latency_ms': latency * 1000,
+                        'throughput': batch_size / latency})
+        print('batch', batch_size, ':', round(latency * 1000, 2), 'ms,', round(batch_size / latency, 1), 'samples/s')
+    return results
+
+
+if __name__ == '__main__':
+    train_X_life_np = np.load('C:/Users/Administrator/Desktop/lstm_work/lstm_result0605/train_X_life_np.npy')
+    train_Y_life_np = np.load('C:/Users/Administrator/Desktop/lstm_work/lstm_result0605/train_Y_life_np.npy')
+    normalizer = LifeNormalizer(clip=2000).fit(train_Y_life_np)
+    model = build_life_model()
+    model.fit(train_X_life_np, normalizer.transform(train_Y_life_np), epochs=5000, batch_size=128, verbose=1)
+    save_life_model(model, normalizer, 'C:/Users/Administrator/Desktop/life_predn5.h5')
+
+    model, normalizer = load_life_model('C:/Users/Administrator/Desktop/life_predn5.h5')
+    yhat = np.load('C:/Users/Administrator/Desktop/yhatn5.npy')
+    life_pred = predict_life(model, normalizer, yhat)
+    np.savetxt('C:/Users/Administrator/Desktop/life_predn5.txt', life_pred)
+    benchmark_life(model)
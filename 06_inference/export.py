@@ -0,0 +1,255 @@
+"""
+Quantized CPU export of the inference models
+The encoder is folded to its z_mean output (no Sampling layer, deterministic), then the encoder,
+LSTM, decoder and life MLP are converted to float16 and int8 TFLite flatbuffers. TFLiteModel
+loads them with tflite_runtime (or tf.lite when only TensorFlow is installed) and has the
+predict / predict_on_batch interface used by CrackLifePredictor, so the service runs on them
+unchanged. report() compares load time, latency, throughput, memory and accuracy (SSIM of the
+predicted frames, life MSE) against the original Keras models.
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+base_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(os.path.join(base_directory, '02_pre_processing'))
+sys.path.append(os.path.join(base_directory, '03_dimension_reduction'))
+sys.path.append(os.path.join(base_directory, '04_pred_crack'))
+sys.path.append(os.path.join(base_directory, '05_pred_life'))
+
+from life_model import LifeNormalizer
+from metrics import ssim_batch
+from service import CrackLifePredictor
+
+MODEL_NAMES = ('encoder', 'lstm', 'decoder', 'life')
+QUANTIZATIONS = ('float16', 'int8')
+
+
+def fold_encoder(encoder):
+    # [z_mean, z_log_var, z] -> z_mean
+    from tensorflow import keras
+    return keras.Model(encoder.input, encoder.get_layer('z_mean').output, name='encoder_z_mean')
+
+
+def is_recurrent(model):
+    from tensorflow import keras
+    return any(isinstance(layer, keras.layers.RNN) for layer in model.layers)
+
+
+def fixed_batch(model, batch_size):
+    # the TFLite converter only lowers the Keras LSTM loops with a static input shape
+    from tensorflow import keras
+    inputs = keras.Input(batch_shape=(batch_size,) + tuple(model.input_shape[1:]))
+    return keras.Model(inputs, model(inputs), name=model.name + '_fixed')
+
+
+def convert(model, quantization, representative=None, n_representative=200, batch_size=None):
+    # float16: weights stored as float16; int8: weights and activations quantized with the ranges of
+    # the representative inputs, float32 in/out so the callers do not change. Recurrent models get
+    # int8 weights with float activations (dynamic range), the calibration of the LSTM loops fails
+    import tensorflow as tf
+
+    recurrent = is_recurrent(model)
+    if batch_size is not None:
+        model = fixed_batch(model, batch_size)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if recurrent:
+            return converter.convert()
+        if representative is None:
+            raise ValueError('int8 quantization needs representative inputs')
+        representative = np.asarray(representative, dtype=np.float32)[:n_representative]
+
+        def representative_dataset():
+            for k in range(len(representative)):
+                yield [representative[k:k + 1]]
+
+        converter.representative_dataset = representative_dataset
+    else:
+        raise ValueError('unknown quantization: ' + str(quantization))
+    return converter.convert()
+
+
+def representative_inputs(encoder, lstm, frames):
+    # frames: uint8 (batch, 2, 92, 136) -> inputs of every model in their real distribution
+    n_batch, n_in, height, width = frames.shape
+    x = frames.reshape(-1, height, width, 1).astype("float32") / 255
+    z_mean = encoder.predict(x, verbose=0)
+    if isinstance(z_mean, (list, tuple)):
+        z_mean = z_mean[0]
+    windows = z_mean.reshape(n_batch, n_in, -1)
+    yhat = lstm.predict(windows, verbose=0)
+    latents = yhat.reshape(-1, yhat.shape[-1])
+    return {'encoder': x, 'lstm': windows, 'decoder': latents, 'life': latents}
+
+
+def export_models(encoder, lstm, decoder, life_model, life_normalizer, output_dir, frames,
+                  quantizations=QUANTIZATIONS, lstm_batch=32):
+    # output_dir/<quantization>/{encoder,lstm,decoder,life}.tflite + life_normalizer.json;
+    # the LSTM is exported with a fixed batch of lstm_batch windows
+    models = {'encoder': fold_encoder(encoder), 'lstm': lstm, 'decoder': decoder, 'life': life_model}
+    inputs = representative_inputs(encoder, lstm, frames)
+    for quantization in quantizations:
+        directory = os.path.join(output_dir, quantization)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for name in MODEL_NAMES:
+            start = time.time()
+            data = convert(models[name], quantization, inputs[name], batch_size=lstm_batch if name == 'lstm' else None)
+            with open(os.path.join(directory, name + '.tflite'), 'wb') as f:
+                f.write(data)
+            print(quantization, name, round(len(data) / 2 ** 20, 2), 'MB in', round(time.time() - start, 2), 's')
+        with open(os.path.join(directory, 'life_normalizer.json'), 'w', encoding='utf-8') as f:
+            json.dump(life_normalizer.to_dict(), f)
+
+
+def make_interpreter(path, num_threads=None):
+    # LiteRT / tflite_runtime are small runtime-only packages, TensorFlow is the fallback
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=num_threads)
+
+
+class TFLiteModel(object):
+    # single-input, single-output TFLite model with a Keras-like predict; a dynamic batch dimension
+    # is resized on demand (batches larger than max_batch are split), a fixed one is filled by padding
+    def __init__(self, path, num_threads=None, max_batch=1024):
+        self.interpreter = make_interpreter(path, num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.fixed_batch = int(self.input['shape_signature'][0]) if self.input['shape_signature'][0] > 0 else None
+        self.max_batch = self.fixed_batch or max_batch
+        self.batch = None
+        if self.fixed_batch:
+            self.interpreter.allocate_tensors()
+            self.batch = self.fixed_batch
+
+    def _invoke(self, x):
+        if self.batch != len(x):
+            self.interpreter.resize_tensor_input(self.input['index'], x.shape)
+            self.interpreter.allocate_tensors()
+            self.batch = len(x)
+        self.interpreter.set_tensor(self.input['index'], x)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output['index']).copy()
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        if len(x) > self.max_batch:
+            return self.predict(x)
+        if self.fixed_batch and len(x) < self.fixed_batch:
+            pad = np.zeros((self.fixed_batch - len(x),) + x.shape[1:], dtype=np.float32)
+            return self._invoke(np.concatenate([x, pad]))[:len(x)]
+        return self._invoke(x)
+
+    def predict(self, x, batch_size=None, verbose=0):
+        batch_size = min(batch_size or self.max_batch, self.max_batch)
+        return np.concatenate([self.predict_on_batch(x[k:k + batch_size]) for k in range(0, len(x), batch_size)])
+
+
+def load_tflite_predictor(directory, num_threads=None, batch_size=1024):
+    models = [TFLiteModel(os.path.join(directory, name + '.tflite'), num_threads, batch_size) for name in MODEL_NAMES]
+    with open(os.path.join(directory, 'life_normalizer.json'), encoding='utf-8') as f:
+        normalizer = LifeNormalizer.from_dict(json.load(f))
+    return CrackLifePredictor(models[0], models[1], models[2], models[3], normalizer, batch_size)
+
+
+def rss_mb():
+    # current resident memory of the process
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (IOError, OSError, ValueError, AttributeError):
+        return float('nan')
+
+
+def profile_predictor(load, frames, repeats=20, batch_size=64):
+    # load: callable returning a predictor; frames: uint8 (n, 2, 92, 136)
+    rss = rss_mb()
+    start = time.perf_counter()
+    predictor = load()
+    load_time = time.perf_counter() - start
+    predictor.predict(frames[:1])  # warm up
+    latencies = []
+    for k in range(repeats):
+        start = time.perf_counter()
+        predictor.predict(frames[k % len(frames):k % len(frames) + 1])
+        latencies.append(time.perf_counter() - start)
+    batch = frames[:batch_size]
+    start = time.perf_counter()
+    for _ in range(max(1, repeats // 4)):
+        pred_frames, lives = predictor.predict(batch)
+    elapsed = (time.perf_counter() - start) / max(1, repeats // 4)
+    profile = {'load_s': load_time,
+               'latency_p50_ms': float(np.percentile(latencies, 50) * 1000),
+               'latency_p99_ms': float(np.percentile(latencies, 99) * 1000),
+               'throughput_rps': len(batch) / elapsed,
+               'memory_mb': rss_mb() - rss}
+    return predictor, profile
+
+
+def accuracy(reference, candidate, frames):
+    # SSIM of the predicted frames and MSE of the predicted lives against the reference predictor
+    ref_frames, ref_lives = reference.predict(frames)
+    pred_frames, lives = candidate.predict(frames)
+    ssim = ssim_batch(pred_frames.reshape(-1, *pred_frames.shape[2:]), ref_frames.reshape(-1, *ref_frames.shape[2:]))
+    return {'ssim': float(ssim.mean()), 'ssim_min': float(ssim.min()),
+            'life_mse': float(np.mean((lives - ref_lives) ** 2)),
+            'life_rel_err': float(np.mean(np.abs(lives - ref_lives) / np.maximum(ref_lives, 1e-12)))}
+
+
+def artifact_size_mb(directory):
+    return sum(os.path.getsize(os.path.join(directory, name + '.tflite')) for name in MODEL_NAMES) / 2 ** 20
+
+
+def report(load_reference, export_dir, frames, quantizations=QUANTIZATIONS, output=None, num_threads=None):
+    # one row per variant: original Keras models and every exported quantization
+    reference, profile = profile_predictor(load_reference, frames)
+    rows = {'keras': profile}
+    for quantization in quantizations:
+        directory = os.path.join(export_dir, quantization)
+        predictor, profile = profile_predictor(lambda: load_tflite_predictor(directory, num_threads), frames)
+        profile.update(accuracy(reference, predictor, frames))
+        profile['size_mb'] = artifact_size_mb(directory)
+        rows[quantization] = profile
+    for name, row in rows.items():
+        print(name, ' '.join('%s=%.4g' % item for item in row.items()))
+    if output is not None:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=1)
+    return rows
+
+
+if __name__ == '__main__':
+    from frame_store import FrameStore
+    from path_slices import SliceView, NS7_FRAMES
+
+    paths = ('C:/Users/Administrator/Desktop/encoder_300_128.h5',
+             'C:/Users/Administrator/Desktop/lstm_200000_mae_modi.h5',
+             'C:/Users/Administrator/Desktop/decoder.h5',
+             'C:/Users/Administrator/Desktop/life_predn5.h5')
+    export_dir = 'C:/Users/Administrator/Desktop/tflite'
+    view = SliceView(FrameStore('C:/Users/dell/Desktop/Dataset_cut_resize_store'), NS7_FRAMES)
+    frames = view[0:64][:, :2]
+    predictor = CrackLifePredictor.load(*paths)
+    export_models(predictor.encoder, predictor.lstm, predictor.decoder, predictor.life_model,
+                  predictor.life_normalizer, export_dir, frames)
+    report(lambda: CrackLifePredictor.load(*paths), export_dir, frames, output=os.path.join(export_dir, 'report.json'))
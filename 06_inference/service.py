@@ -0,0 +1,260 @@
+"""
+Crack path and fatigue life inference service
+The encoder (03), the seq2seq LSTM (04), the decoder and the life MLP (05) are loaded once;
+two observed crack frames go in, the predicted future frames and their fatigue lives come out.
+Concurrent requests are batched dynamically within a latency budget.
+"""
+
+import base64
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+base_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(os.path.join(base_directory, '03_dimension_reduction'))
+sys.path.append(os.path.join(base_directory, '05_pred_life'))
+
+FRAME_SHAPE = (2, 92, 136)  # two observed frames per request
+
+
+class CrackLifePredictor(object):
+    def __init__(self, encoder, lstm, decoder, life_model, life_normalizer, batch_size=1024):
+        self.encoder = encoder
+        self.lstm = lstm
+        self.decoder = decoder
+        self.life_model = life_model
+        self.life_normalizer = life_normalizer
+        self.batch_size = batch_size
+
+    @classmethod
+    def load(cls, encoder_path, lstm_path, decoder_path, life_path):
+        import tensorflow as tf
+        from vae import load_encoder
+        from life_model import load_life_model
+
+        encoder = load_encoder(encoder_path)
+        lstm = tf.keras.models.load_model(lstm_path, compile=False)
+        decoder = tf.keras.models.load_model(decoder_path, compile=False)
+        life_model, life_normalizer = load_life_model(life_path)
+        return cls(encoder, lstm, decoder, life_model, life_normalizer)
+
+    def _predict(self, model, x):
+        # predict_on_batch avoids the per-call overhead of predict for the small batches of a service
+        if len(x) <= self.batch_size:
+            return model.predict_on_batch(x)
+        return model.predict(x, batch_size=self.batch_size, verbose=0)
+
+    def predict(self, frames):
+        # frames: uint8 (batch, 2, 92, 136) -> predicted frames uint8 (batch, 6, 92, 136), lives (batch, 6)
+        frames = np.asarray(frames, dtype=np.uint8)
+        n_batch, n_in, height, width = frames.shape
+        x = frames.reshape(-1, height, width, 1).astype("float32") / 255
+        z_mean = self._predict(self.encoder, x)
+        if isinstance(z_mean, (list, tuple)):
+            z_mean = z_mean[0]
+        yhat = self._predict(self.lstm, z_mean.reshape(n_batch, n_in, -1))
+        n_out, latent_dim = yhat.shape[1:]
+        x_decoded = self._predict(self.decoder, yhat.reshape(-1, latent_dim))
+        pred_frames = np.clip(x_decoded * 255, 0, 255).astype(np.uint8).reshape(n_batch, n_out, height, width)
+        label = self._predict(self.life_model, yhat.reshape(-1, latent_dim))
+        lives = self.life_normalizer.inverse_transform(label.reshape(n_batch, n_out))
+        return pred_frames, lives
+
+
+class BatchingService(object):
+    # requests are queued; a worker thread takes the first one and keeps collecting until
+    # max_batch requests are in hand or max_wait_ms has passed since the first one was submitted,
+    # then runs one batched prediction; latency percentiles cover the last stats_window requests
+    def __init__(self, predictor, max_batch=64, max_wait_ms=10.0, frame_shape=FRAME_SHAPE, stats_window=10000):
+        self.predictor = predictor
+        self.frame_shape = tuple(frame_shape)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.latencies = deque(maxlen=stats_window)
+        self.batch_sizes = deque(maxlen=stats_window)
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.started = None
+        self.last_done = None
+        self.running = True
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, frames):
+        frames = np.asarray(frames, dtype=np.uint8)
+        if frames.shape != self.frame_shape:
+            raise ValueError('frames must have shape %s, got %s' % (self.frame_shape, frames.shape))
+        future = Future()
+        self.requests.put((time.perf_counter(), frames, future))
+        return future
+
+    def predict(self, frames):
+        return self.submit(frames).result()
+
+    def _collect(self):
+        first = self.requests.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = first[0] + self.max_wait
+        while len(batch) < self.max_batch:
+            # once the budget of the first request is used up, only take what is already queued
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.running = False
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while self.running:
+            batch = self._collect()
+            if not batch:
+                break
+            try:
+                pred_frames, lives = self.predictor.predict(np.stack([item[1] for item in batch]))
+            except Exception:
+                # predict the requests one by one so that a failing request only fails its own future
+                for item in batch:
+                    self._run_single(item)
+                continue
+            self._record([item[0] for item in batch])
+            for k, (_, _, future) in enumerate(batch):
+                future.set_result((pred_frames[k], lives[k]))
+
+    def _run_single(self, item):
+        submitted, frames, future = item
+        try:
+            pred_frames, lives = self.predictor.predict(frames[None])
+        except Exception as e:
+            future.set_exception(e)
+            return
+        self._record([submitted])
+        future.set_result((pred_frames[0], lives[0]))
+
+    def _record(self, submitted):
+        done = time.perf_counter()
+        with self.lock:
+            if self.started is None:
+                self.started = min(submitted)
+            self.last_done = done
+            self.completed += len(submitted)
+            self.batch_sizes.append(len(submitted))
+            self.latencies.extend(done - t for t in submitted)
+
+    def stats(self):
+        # rps over the time between the first submit and the last completion, so idle time
+        # after the last request does not lower it
+        with self.lock:
+            if not self.completed:
+                return {'requests': 0}
+            latencies = np.array(self.latencies)
+            elapsed = max(self.last_done - self.started, 1e-9)
+            return {'requests': self.completed,
+                    'p50_ms': float(np.percentile(latencies, 50) * 1000),
+                    'p99_ms': float(np.percentile(latencies, 99) * 1000),
+                    'rps': self.completed / elapsed,
+                    'mean_batch': float(np.mean(self.batch_sizes))}
+
+    def reset_stats(self):
+        with self.lock:
+            self.latencies.clear()
+            self.batch_sizes.clear()
+            self.completed = 0
+            self.started = None
+            self.last_done = None
+
+    def close(self):
+        self.requests.put(None)
+        self.worker.join()
+
+
+def encode_png(img):
+    return base64.b64encode(cv2.imencode('.png', img)[1].tobytes()).decode('ascii')
+
+
+def decode_png(data):
+    buf = np.frombuffer(base64.b64decode(data), dtype=np.uint8)
+    return cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+
+
+def make_handler(service):
+    # POST /predict {"frames": [png_base64, png_base64]} -> {"frames": [png_base64 x 6], "life": [6 floats]}
+    # GET /stats -> latency percentiles and requests per second
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._reply(200, service.stats())
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._reply(404, {'error': 'not found'})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                images = [decode_png(f) for f in request['frames']]
+                if any(img is None for img in images):
+                    raise ValueError('frames must be PNG images')
+                future = service.submit(np.stack(images))
+            except (ValueError, KeyError, TypeError) as e:
+                self._reply(400, {'error': str(e)})
+                return
+            try:
+                pred_frames, lives = future.result()
+            except Exception as e:
+                self._reply(500, {'error': str(e)})
+                return
+            self._reply(200, {'frames': [encode_png(f) for f in pred_frames], 'life': lives.tolist()})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(service, host='127.0.0.1', port=8500):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print('serving on http://%s:%d' % (host, port))
+    server.serve_forever()
+
+
+def benchmark_service(service, frames, n_requests=1000, concurrency=32):
+    # fire n_requests from concurrency client threads, frames: uint8 (n, 2, 92, 136) request pool
+    service.reset_stats()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda i: service.predict(frames[i % len(frames)]), range(n_requests)))
+    stats = service.stats()
+    print(json.dumps(stats, indent=1))
+    return stats
+
+
+if __name__ == '__main__':
+    predictor = CrackLifePredictor.load('C:/Users/Administrator/Desktop/encoder_300_128.h5',
+                                        'C:/Users/Administrator/Desktop/lstm_200000_mae_modi.h5',
+                                        'C:/Users/Administrator/Desktop/decoder.h5',
+                                        'C:/Users/Administrator/Desktop/life_predn5.h5')
+    serve(BatchingService(predictor, max_batch=64, max_wait_ms=10.0))
@@ -0,0 +1,231 @@
+"""
+Stage-level benchmark of the FCG pipeline on a synthetic dataset
+Crack paths are generated with the analytical SIF backend (result.txt + coordinate files), rasterized
+to 136x92 frames and run through every stage: crop/binarize of screenshot-sized images,
+resize/sampling, VAE encoding, window building, LSTM prediction, decoding, life inference and
+metrics. Every stage is timed and its memory recorded (tracemalloc peak of this process and
+ru_maxrss), the result is one JSON file; with --baseline the stages slower than the baseline by
+more than --threshold are reported and the exit code is 1, so CI can fail on regressions.
+The TensorFlow stages use untrained models of the real architectures and are skipped when
+TensorFlow is not installed. Stages run with a process pool only trace the parent process.
+
+    python benchmark_pipeline.py --samples 50 --output bench.json
+    python benchmark_pipeline.py --samples 50 --output bench_new.json --baseline bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+base_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+for stage_directory in ('01_data_generation', '02_pre_processing', '03_dimension_reduction', '04_pred_crack',
+                        '05_pred_life'):
+    sys.path.append(os.path.join(base_directory, stage_directory))
+
+from sif_backend import AnalyticalSIF, propagate_paths, write_results
+from life import compute_life
+from pipeline import DEFAULT_STAGES, apply_stages
+from rasterize import rasterize_directory
+from path_slices import SliceView, NS7_FRAMES
+from sequence_builder import build_windows
+from metrics import ssim_batch, displacement_rms_batch
+
+try:
+    import tensorflow as tf
+except ImportError:
+    tf = None
+
+RAW_SHAPE = (1400, 900)  # screenshot stand-in, cropped to (1360, 860) by the 254 border
+
+
+def max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+
+
+class StageTimer(object):
+    def __init__(self, trace=True):
+        self.trace = trace
+        self.stages = {}
+
+    def run(self, name, func, items=None):
+        # func() -> result; items: count of processed items for the throughput
+        if self.trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        stage = {'seconds': seconds}
+        if self.trace:
+            stage['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        stage['max_rss_mb'] = max_rss_mb()
+        if items is not None:
+            stage['items'] = int(items)
+            stage['items_per_s'] = items / max(seconds, 1e-12)
+        self.stages[name] = stage
+        print('%-16s %9.3f s' % (name, seconds) + ('  %8.1f items/s' % stage['items_per_s'] if items else ''))
+        return result
+
+    def skip(self, name, reason):
+        self.stages[name] = {'skipped': reason}
+        print('%-16s skipped (%s)' % (name, reason))
+
+
+def write_coordinates(xfem_directory, coordinate_directory):
+    # coordinate/SampleN.txt files for life.py, same columns as result.txt
+    os.makedirs(coordinate_directory, exist_ok=True)
+    for sample in os.listdir(xfem_directory):
+        path = os.path.join(xfem_directory, sample, 'result.txt')
+        if os.path.exists(path):
+            shutil.copyfile(path, os.path.join(coordinate_directory, 'S' + sample[1:] + '.txt'))
+
+
+def raw_screenshots(frames):
+    # 136x92 frames -> screenshot-sized BGR images with the 254 background border of the ODB export,
+    # the crack lands in the windows of DEFAULT_STAGES
+    images = []
+    for frame in frames:
+        img = np.full(RAW_SHAPE + (3,), 254, dtype=np.uint8)
+        img[20:-20, 20:-20] = 255
+        crack = cv2.resize(frame, (677, 450), interpolation=cv2.INTER_NEAREST)
+        img[20 + 692:20 + 1142, 20 + 103:20 + 780] = crack[:, :, None]
+        images.append(img)
+    return images
+
+
+def run(args):
+    work_directory = args.work_dir or tempfile.mkdtemp(prefix='fcg_bench_')
+    xfem_directory = os.path.join(work_directory, 'xfem')
+    coordinate_directory = os.path.join(work_directory, 'coordinate')
+    timer = StageTimer(not args.no_trace)
+    rng = np.random.RandomState(args.seed)
+
+    # 01 data generation
+    paths = timer.run('generate_paths', lambda: propagate_paths(AnalyticalSIF(), args.samples, seed=args.seed),
+                      args.samples)
+    timer.run('write_results', lambda: write_results(xfem_directory, paths, workers=args.workers), args.samples)
+    write_coordinates(xfem_directory, coordinate_directory)
+    names, _ = timer.run('life_labels', lambda: compute_life(coordinate_directory, os.path.join(work_directory, 'life.npz'),
+                                                             workers=args.workers), args.samples)
+
+    # 02 pre-processing
+    store = timer.run('rasterize', lambda: rasterize_directory(xfem_directory, os.path.join(work_directory, 'store'),
+                                                               workers=args.workers), args.samples)
+    n_raw = min(args.raw_images, store.shape[0] * store.shape[1])
+    raw = raw_screenshots(store.array.reshape((-1,) + store.shape[2:])[:n_raw])
+    binary = timer.run('crop_binarize', lambda: [apply_stages(img, DEFAULT_STAGES[:4]) for img in raw], n_raw)
+    timer.run('resize', lambda: [apply_stages(img, DEFAULT_STAGES[4:]) for img in binary], n_raw)
+    view = SliceView(store, NS7_FRAMES, pad=4)
+    frames = timer.run('sampling', lambda: view[0:len(view)], len(view))
+
+    # 03 dimension reduction
+    n_sample, n_frame, height, width = frames.shape
+    if tf is None or args.skip_tf:
+        timer.skip('vae_encode', 'tensorflow not available' if tf is None else '--skip-tf')
+        latents = rng.normal(size=(n_sample, n_frame, args.latent_dim)).astype(np.float32)
+    else:
+        from vae import build_encoder, build_decoder
+        from sequence_builder import encode_samples, z_mean_encoder
+        encoder = build_encoder(args.latent_dim)
+        latents = timer.run('vae_encode', lambda: encode_samples(frames, z_mean_encoder(encoder, args.batch_size)),
+                            n_sample * n_frame)
+    train_X_np, train_Y_np = timer.run('windows', lambda: build_windows(latents, 2, 6), n_sample)
+
+    # 04 crack path prediction, 05 life prediction
+    truth = np.repeat(frames[:, -1:], train_Y_np.shape[0] // n_sample * train_Y_np.shape[1], axis=1)
+    truth = truth.reshape(-1, height, width)
+    if tf is None or args.skip_tf:
+        for name in ('lstm', 'decode', 'life_inference'):
+            timer.skip(name, 'tensorflow not available' if tf is None else '--skip-tf')
+        pred = np.roll(truth, 1, axis=1)
+    else:
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import LSTM, Dense, RepeatVector, TimeDistributed, Input
+        from life_model import build_life_model, predict_life, LifeNormalizer
+        lstm = Sequential([Input((2, args.latent_dim)), LSTM(100, activation='tanh'), RepeatVector(6),
+                           LSTM(100, activation='tanh', return_sequences=True), TimeDistributed(Dense(args.latent_dim))])
+        yhat = timer.run('lstm', lambda: lstm.predict(train_X_np, batch_size=args.batch_size, verbose=0),
+                         len(train_X_np))
+        decoder = build_decoder(args.latent_dim)
+        flat = yhat.reshape(-1, args.latent_dim)
+        x_decoded = timer.run('decode', lambda: decoder.predict(flat, batch_size=args.batch_size, verbose=0),
+                              len(flat))
+        pred = np.clip(x_decoded * 255, 0, 255).astype(np.uint8).reshape(-1, height, width)
+        life_model = build_life_model(args.latent_dim)
+        normalizer = LifeNormalizer(2000.0, np.log(2000.0))
+        timer.run('life_inference', lambda: predict_life(life_model, normalizer, yhat), len(flat))
+    timer.run('metrics', lambda: (ssim_batch(pred[:, :, 119:], truth[:, :, 119:]),
+                                  displacement_rms_batch(pred[:, :, 119:], truth[:, :, 119:])), len(pred))
+
+    if not args.keep and not args.work_dir:
+        shutil.rmtree(work_directory, ignore_errors=True)
+    return {'config': {'samples': args.samples, 'finished_samples': len(names), 'raw_images': n_raw,
+                       'latent_dim': args.latent_dim, 'batch_size': args.batch_size, 'workers': args.workers,
+                       'seed': args.seed},
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'cpu_count': os.cpu_count(), 'numpy': np.__version__, 'opencv': cv2.__version__,
+                            'tensorflow': None if tf is None else tf.__version__},
+            'stages': timer.stages}
+
+
+def compare(result, baseline, threshold=0.2, min_seconds=0.05):
+    # stages slower than the baseline by more than threshold (relative); stages shorter than
+    # min_seconds in both runs are too noisy to compare
+    regressions = []
+    for name, stage in result['stages'].items():
+        old = baseline['stages'].get(name)
+        if old is None or 'seconds' not in stage or 'seconds' not in old:
+            continue
+        if max(stage['seconds'], old['seconds']) < min_seconds:
+            continue
+        ratio = stage['seconds'] / max(old['seconds'], 1e-12)
+        if ratio > 1 + threshold:
+            regressions.append((name, old['seconds'], stage['seconds'], ratio))
+    for name, old, new, ratio in regressions:
+        print('REGRESSION %-16s %9.3f s -> %9.3f s (x%.2f)' % (name, old, new, ratio))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--samples', type=int, default=50, help='synthetic crack paths')
+    parser.add_argument('--raw-images', type=int, default=20, help='screenshot-sized images for crop/binarize')
+    parser.add_argument('--latent-dim', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=None, help='keep the synthetic dataset in this directory')
+    parser.add_argument('--keep', action='store_true', help='do not delete the temporary dataset')
+    parser.add_argument('--skip-tf', action='store_true', help='skip the TensorFlow stages')
+    parser.add_argument('--no-trace', action='store_true', help='do not trace memory (lower overhead)')
+    parser.add_argument('--output', default=None, help='JSON result file')
+    parser.add_argument('--baseline', default=None, help='JSON result of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown per stage')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    result = run(args)
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=1)
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.threshold):
+            sys.exit(1)